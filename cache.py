@@ -0,0 +1,390 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    带过期时间的 LRU 缓存，超过 maxsize 时淘汰最久未使用的条目。
+    """
+
+    def __init__(self, maxsize: int, default_ttl: float):
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = _MISSING) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None):
+        ttl = self.default_ttl if ttl is None else ttl
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class ResponseCache:
+    """
+    API 响应缓存。
+    相同 key 的并发请求共享同一个上游 future，结果按 key 对应的 TTL 缓存。
+    """
+
+    def __init__(self, maxsize: int, default_ttl: float):
+        self._cache = TTLCache(maxsize, default_ttl)
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get_or_fetch(
+        self,
+        key: Hashable,
+        fetcher: Callable[[], Awaitable[Any]],
+        ttl: float | None = None,
+    ) -> Any:
+        value = self._cache.get(key)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            # shield: 某个调用方被取消时不影响其他等待者
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        task = asyncio.ensure_future(fetcher())
+        self._inflight[key] = task
+        try:
+            value = await asyncio.shield(task)
+        finally:
+            if task.done():
+                self._inflight.pop(key, None)
+            else:
+                task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        self._cache.set(key, value, ttl)
+        return value
+
+    def invalidate(self, key: Hashable):
+        self._cache.pop(key)
+
+    def clear(self):
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses + self.coalesced
+        return {
+            "size": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": (self.hits + self.coalesced) / total if total else 0.0,
+        }
+
+
+class CardCache:
+    """
+    渲染结果的磁盘缓存。
+    key 为模板和渲染数据的内容哈希，按总条数和总字节数做 LRU 淘汰。
+    """
+
+    def __init__(self, directory: str, max_entries: int, max_bytes: int):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._loaded = False
+
+    def _load(self):
+        # 启动后第一次使用时扫描已有文件，按修改时间恢复 LRU 顺序
+        self._loaded = True
+        if not os.path.isdir(self.directory):
+            return
+        files = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".png"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            files.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._total_bytes += size
+        self._evict()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.png")
+
+    def get(self, key: str) -> str | None:
+        if not self._loaded:
+            self._load()
+        if key not in self._entries:
+            self.misses += 1
+            return None
+        path = self._path(key)
+        if not os.path.exists(path):
+            self._total_bytes -= self._entries.pop(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return path
+
+    def put(self, key: str, source_path: str) -> str:
+        if not self._loaded:
+            self._load()
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        # 先写临时文件再替换，避免并发读取到写了一半的图片
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        shutil.copyfile(source_path, tmp_path)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+        if key in self._entries:
+            self._total_bytes -= self._entries[key]
+        self._entries[key] = size
+        self._entries.move_to_end(key)
+        self._total_bytes += size
+        self._evict()
+        return path
+
+    def _evict(self):
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes
+        ):
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "bytes": self._total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class SkinCache:
+    """
+    玩家皮肤的磁盘缓存。
+    - 超过 ttl 的皮肤需要重新校验（支持 ETag / Last-Modified 条件请求）
+    - 404 和超时会被短暂记住，期间不再请求上游
+    - 按总字节数做 LRU 淘汰；访问时间写回磁盘的精度为 ACCESS_PERSIST_INTERVAL，
+      重启后的淘汰顺序按这个精度近似
+    """
+
+    USERNAME_RE = re.compile(r"[A-Za-z0-9_]{1,16}")
+    # 访问时间最多每隔这么久（秒）写回一次元数据，避免每次读取都写盘
+    ACCESS_PERSIST_INTERVAL = 60 * 60
+
+    def __init__(self, directory: str, ttl: float, negative_ttl: float, max_bytes: int):
+        self.directory = directory
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._negative = TTLCache(4096, negative_ttl)
+        self._total_bytes = 0
+        self._loaded = False
+
+    @classmethod
+    def key_for(cls, uname: str) -> str:
+        # 合法的 MC 用户名直接作为文件名，其他输入一律哈希，避免路径穿越
+        if cls.USERNAME_RE.fullmatch(uname):
+            return uname.lower()
+        return "h_" + hashlib.sha1(uname.encode("utf-8")).hexdigest()
+
+    def _skin_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.skin")
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _load(self):
+        self._loaded = True
+        if not os.path.isdir(self.directory):
+            return
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".skin"):
+                continue
+            key = name[:-5]
+            try:
+                size = os.path.getsize(self._skin_path(key))
+                with open(self._meta_path(key), "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            meta["size"] = size
+            entries.append((meta.get("accessed_at", 0), key, meta))
+        for _, key, meta in sorted(entries):
+            self._entries[key] = meta
+            self._total_bytes += meta["size"]
+        self._evict()
+
+    def get(self, uname: str) -> tuple[bytes | None, dict | None]:
+        """
+        返回缓存的皮肤和元数据，不存在时返回 (None, None)。
+        """
+        if not self._loaded:
+            self._load()
+        key = self.key_for(uname)
+        meta = self._entries.get(key)
+        if meta is None:
+            return None, None
+        try:
+            with open(self._skin_path(key), "rb") as f:
+                content = f.read()
+        except OSError:
+            self._drop(key)
+            return None, None
+        now = time.time()
+        if now - meta.get("accessed_at", 0) >= self.ACCESS_PERSIST_INTERVAL:
+            meta["accessed_at"] = now
+            try:
+                self._write_meta(key, meta)
+            except OSError:
+                pass
+        self._entries.move_to_end(key)
+        return content, meta
+
+    def is_fresh(self, meta: dict | None) -> bool:
+        return meta is not None and time.time() - meta.get("fetched_at", 0) < self.ttl
+
+    def is_negative(self, uname: str) -> bool:
+        return self._negative.get(self.key_for(uname), None) is not None
+
+    def mark_negative(self, uname: str, ttl: float | None = None):
+        self._negative.set(self.key_for(uname), True, ttl)
+
+    def conditional_headers(self, meta: dict | None) -> dict:
+        headers = {}
+        if meta:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def put(self, uname: str, content: bytes, etag: str | None = None, last_modified: str | None = None):
+        if not self._loaded:
+            self._load()
+        os.makedirs(self.directory, exist_ok=True)
+        key = self.key_for(uname)
+        now = time.time()
+        meta = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": now,
+            "accessed_at": now,
+            "size": len(content),
+        }
+        _atomic_write(self._skin_path(key), content)
+        self._write_meta(key, meta)
+        if key in self._entries:
+            self._total_bytes -= self._entries[key]["size"]
+        self._entries[key] = meta
+        self._entries.move_to_end(key)
+        self._total_bytes += meta["size"]
+        self._negative.pop(key)
+        self._evict()
+
+    def refresh(self, uname: str):
+        """
+        上游返回 304 时调用，延长已有缓存的有效期。
+        """
+        key = self.key_for(uname)
+        meta = self._entries.get(key)
+        if meta is None:
+            return
+        meta["fetched_at"] = time.time()
+        self._write_meta(key, meta)
+
+    def _write_meta(self, key: str, meta: dict):
+        stored = {k: v for k, v in meta.items() if k != "size"}
+        _atomic_write(self._meta_path(key), json.dumps(stored).encode("utf-8"))
+
+    def _drop(self, key: str):
+        meta = self._entries.pop(key, None)
+        if meta is not None:
+            self._total_bytes -= meta["size"]
+        for path in (self._skin_path(key), self._meta_path(key)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _evict(self):
+        while self._entries and self._total_bytes > self.max_bytes:
+            key = next(iter(self._entries))
+            self._drop(key)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "bytes": self._total_bytes,
+            "negative": len(self._negative),
+        }
+
+
+def remove_legacy_skins(assets_dir: str, keep) -> int:
+    """
+    删除旧版本直接保存在静态资源目录中的 <玩家名>.webp 皮肤，返回删除的文件数。
+    keep 中的文件（模板用到的图标和背景）保留。
+    """
+    removed = 0
+    if not os.path.isdir(assets_dir):
+        return removed
+    for name in os.listdir(assets_dir):
+        if not name.endswith(".webp") or name in keep:
+            continue
+        try:
+            os.remove(os.path.join(assets_dir, name))
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def _atomic_write(path: str, content: bytes):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
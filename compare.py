@@ -0,0 +1,101 @@
+import asyncio
+from typing import NamedTuple
+import httpx
+from astrbot.api import logger
+from astrbot.api.all import Star
+from .constant import *
+from .paceman import (
+    UserSessionStats,
+    common_template_data,
+    fetch_skin_bytes,
+    render_template_card,
+    session_render_data,
+    skin_data_uri,
+)
+from .utils import fetch_api_data, fetch_optional, parse_time
+
+
+class CompareEntry(NamedTuple):
+    username: str
+    stats: UserSessionStats | None
+    nph_stats: dict
+    skin: bytes | None
+
+
+async def fetch_compare_entries(
+    usernames: list[str],
+    client: httpx.AsyncClient | None = None,
+    concurrency: int = COMPARE_CONCURRENCY,
+) -> list[CompareEntry]:
+    """
+    同时获取所有玩家的 24 小时数据、NPH 和皮肤，所有请求共用一个并发上限。
+    没有数据或请求失败的玩家 stats 为 None。
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(awaitable):
+        async with semaphore:
+            return await awaitable
+
+    async def fetch_session(username: str) -> UserSessionStats | None:
+        try:
+            data = await bounded(fetch_api_data(
+                "paceman", "session_stats", username,
+                timeout=SESSION_TIMEOUT, client=client,
+            ))
+            return UserSessionStats(**data) if data and data.get("nether") else None
+        except Exception as e:
+            logger.info(f"获取 {username} 的对比数据失败: {e}")
+            return None
+
+    async def fetch_one(username: str) -> CompareEntry:
+        stats, nph_stats, skin = await asyncio.gather(
+            fetch_session(username),
+            fetch_optional(
+                bounded(fetch_api_data(
+                    "paceman", "nph_stats", username,
+                    timeout=NPH_TIMEOUT, client=client,
+                )),
+                NPH_TIMEOUT, {}, "获取NPH数据",
+            ),
+            fetch_optional(
+                bounded(fetch_skin_bytes(username, client, timeout=SKIN_TIMEOUT)),
+                SKIN_TIMEOUT, None, "获取皮肤",
+            ),
+        )
+        return CompareEntry(username, stats, nph_stats or {}, skin)
+
+    return list(await asyncio.gather(*(fetch_one(username) for username in usernames)))
+
+
+def compare_render_data(entries: list[CompareEntry]) -> dict:
+    """
+    每个阶段数量最多的玩家标记为 best，数量相同时平均时间更快的优先。
+    """
+    players = [
+        {"uname": entry.username, "skin_uri": skin_data_uri(entry.skin)}
+        | session_render_data(entry.stats, entry.nph_stats)
+        for entry in entries
+    ]
+    for split in SPLIT_ICONS:
+        ranks = [(-player["stats"][split]["count"], parse_time(player["stats"][split]["avg"])) for player in players]
+        best = min(ranks)
+        for player, rank in zip(players, ranks):
+            player["stats"][split]["best"] = rank == best and player["stats"][split]["count"] > 0
+    return common_template_data("", include_assets=False) | {"players": players}
+
+
+def compare_text(entries: list[CompareEntry]) -> str:
+    lines = [" vs ".join(entry.username for entry in entries)]
+    for split in SPLIT_ICONS:
+        values = []
+        for entry in entries:
+            stats = session_render_data(entry.stats)["stats"][split]
+            values.append(f"{stats['count']}({stats['avg']})")
+        lines.append(f"{SPLIT_LABELS[split]}: " + " / ".join(values))
+    lines.append("NPH: " + " / ".join(str(entry.nph_stats.get("rnph", 0)) for entry in entries))
+    return "\n".join(lines)
+
+
+async def render_compare(star: Star, entries: list[CompareEntry]) -> str | None:
+    return await render_template_card(star, "compare", compare_render_data(entries))
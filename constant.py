@@ -4,6 +4,7 @@ from typing import Dict
 CURRENT_DIR = os.path.dirname(__file__)
 ASSETS_DIR = os.path.join(CURRENT_DIR, "public")
 TEMPLATE_DIR = os.path.join(ASSETS_DIR, "templates")
+RESULT_DIR = os.path.join(CURRENT_DIR, "result")
 
 CARD_TEMPLATES: Dict[str, dict] = {
     "pacestats": {
@@ -15,15 +16,128 @@ CARD_TEMPLATES: Dict[str, dict] = {
         "name": "run",
         "path": os.path.join(TEMPLATE_DIR, "run.html"),
         "file": "run.html",
-    }
+    },
+    "leaderboard": {
+        "name": "leaderboard",
+        "path": os.path.join(TEMPLATE_DIR, "leaderboard.html"),
+        "file": "leaderboard.html",
+    },
+    "splits": {
+        "name": "splits",
+        "path": os.path.join(TEMPLATE_DIR, "splits.html"),
+        "file": "splits.html",
+    },
+    "rank": {
+        "name": "rank",
+        "path": os.path.join(TEMPLATE_DIR, "rank.html"),
+        "file": "rank.html",
+    },
+    "compare": {
+        "name": "compare",
+        "path": os.path.join(TEMPLATE_DIR, "compare.html"),
+        "file": "compare.html",
+    },
 }
 
 DEFAULT_TEMPLATE = "pacestats"
+# 所有卡片模板的尺寸（与模板 CSS 中 body 的宽高一致）
+CARD_SIZE = (1280, 720)
+
+FONT_FILE = "1_Minecraft-Regular.otf"
+BACKGROUND_FILE = "background.webp"
+# 卡片上按顺序展示的各阶段图标
+SPLIT_ICONS = ("nether", "bastion", "fortress", "first_portal", "stronghold", "end", "finish")
+SPLIT_LABELS: Dict[str, str] = {
+    "nether": "下界",
+    "bastion": "猪堡",
+    "fortress": "下要",
+    "first_portal": "盲传",
+    "stronghold": "要塞",
+    "end": "末地",
+    "finish": "完成",
+}
+# 模板内联的静态资源：文件名 -> MIME 类型
+TEMPLATE_ASSETS: Dict[str, str] = {
+    FONT_FILE: "font/otf",
+    BACKGROUND_FILE: "image/webp",
+} | {f"{key}.webp": "image/webp" for key in SPLIT_ICONS}
 
 def get_template_path(type: str) -> str:
     template = CARD_TEMPLATES.get(type, CARD_TEMPLATES[DEFAULT_TEMPLATE])
     return template["path"]
 
-MAX_ATTEMPTS = 10
-RETRY_DELAY = 2
-RECENT_DYNAMIC_CACHE = 4
+# html_render 重试：最多尝试次数、指数退避的初始和最大间隔、单次命令的总时限（秒）
+MAX_ATTEMPTS = 4
+RETRY_DELAY = 0.5
+RETRY_MAX_DELAY = 4
+RENDER_DEADLINE = 12
+# 渲染服务熔断：连续失败次数阈值和熔断后的探测间隔（秒）
+RENDER_BREAKER_THRESHOLD = 3
+RENDER_BREAKER_RESET = 60
+# 渲染方式：html 使用 html_render 并在失败时回退到 PIL，fast 只使用 PIL
+RENDER_MODE_HTML = "html"
+RENDER_MODE_FAST = "fast"
+# 批量渲染时一个页面最多放几张卡片
+BATCH_RENDER_MAX_CARDS = 6
+
+# 渲染结果缓存：最多保留的卡片数量和总字节数
+CACHE_DIR = os.path.join(CURRENT_DIR, "cache")
+CARD_CACHE_DIR = os.path.join(CACHE_DIR, "cards")
+RECENT_DYNAMIC_CACHE = 128
+CARD_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# 皮肤缓存：有效期、404 的负缓存时间、超时等错误的负缓存时间（秒）和总大小
+SKIN_CACHE_DIR = os.path.join(CACHE_DIR, "skins")
+SKIN_CACHE_TTL = 24 * 60 * 60
+SKIN_NEGATIVE_TTL = 60 * 60
+SKIN_TIMEOUT_NEGATIVE_TTL = 2 * 60
+SKIN_CACHE_MAX_BYTES = 128 * 1024 * 1024
+
+# PIL 回退渲染的线程数和排队上限
+FALLBACK_WORKERS = 2
+FALLBACK_QUEUE_SIZE = 8
+
+# /paceman 并发请求的单独超时（秒）
+SESSION_TIMEOUT = 10.0
+NPH_TIMEOUT = 6.0
+SKIN_TIMEOUT = 8.0
+
+# 排行榜：同时请求的玩家数和卡片上展示的名次数
+LEADERBOARD_CONCURRENCY = 16
+LEADERBOARD_SIZE = 12
+
+# 定时播报：默认发送时间，以及提前多少秒开始准备数据
+DEFAULT_BROADCAST_TIME = (22, 0)
+BROADCAST_PREPARE_LEAD = 5 * 60
+# 每日播报附带前几名玩家的 24 小时数据卡片
+BROADCAST_TOP_CARDS = 3
+
+# /watch 轮询：调度间隔、活跃玩家的轮询间隔、空闲玩家的最长间隔（秒）
+WATCH_TICK = 5
+WATCH_ACTIVE_INTERVAL = 20
+WATCH_IDLE_INTERVAL = 300
+# 最近一次 run 在这段时间（秒）内有更新视为正在游戏
+WATCH_ACTIVE_WINDOW = 10 * 60
+WATCH_CONCURRENCY = 8
+WATCH_MAX_PER_TARGET = 10
+# 推送通知的阶段
+WATCH_SPLITS = {
+    "nether": "进入下界",
+    "stronghold": "进入要塞",
+    "finish": "完成",
+}
+
+# /splits 分析：滚动平均的窗口大小（最近多少次到达该阶段）
+SPLITS_ROLLING_WINDOW = 10
+# 未注册也未关注的玩家，本地 run 历史在这段时间（秒）内没有再查询就删除
+RUN_HISTORY_TTL = 14 * 24 * 60 * 60
+
+# Ranked 比赛记录：每页数量、首次同步最多翻几页、卡片上展示最近多少场
+RANKED_MATCH_PAGE_SIZE = 100
+RANKED_HISTORY_PAGES = 3
+RANKED_CHART_MATCHES = 100
+RANKED_MATCHES_TIMEOUT = 8
+
+# /compare：最多对比的玩家数，所有玩家的请求共用的并发上限
+COMPARE_MAX_PLAYERS = 4
+COMPARE_CONCURRENCY = 8
@@ -0,0 +1,281 @@
+import io
+import os
+import threading
+from PIL import Image, ImageDraw, ImageFont
+from astrbot.api import logger
+from .constant import *
+from .paceman import RunStats, UserSessionStats, run_render_data, session_render_data
+
+# 各元素位置，对应 pacestats.html 和 run.html 的 CSS 布局
+TEXT_COLOR = (247, 250, 252)
+# 文字阴影：向下偏移的像素和不透明度
+TEXT_SHADOW = (4, 0.42)
+
+PACESTATS_LAYOUT = {
+    "icon_x": 110, "icon_size": 52, "text_x": 172, "font_size": 48,
+    "row_top": 54, "row_height": 58, "row_gap": 13,
+    "name_center": 982, "name_top": 50, "name_size": 38, "name_width": 360,
+    "skin_box": (832, 104, 300, 462), "skin_shadow": 14,
+}
+RUN_LAYOUT = {
+    "icon_x": 134, "icon_size": 64, "text_x": 220, "font_size": 60,
+    "row_top": 26, "row_height": 72, "row_gap": 15,
+    "name_center": 980, "name_top": 45, "name_size": 38, "name_width": 360,
+    "skin_box": (821, 113, 318, 486), "skin_shadow": 14,
+}
+# pacestats 底部 NPH 概览栏
+SUMMARY_BOX = (64, 570, 1152, 104)
+SUMMARY_LABEL_SIZE = 18
+SUMMARY_VALUE_SIZE = 44
+# 字体没有中文字形，概览栏标签使用英文
+SUMMARY_LABELS = (
+    ("rnph", "NPH"),
+    ("rpe", "RPE"),
+    ("resets", "24H RESETS"),
+    ("total_resets", "TOTAL RESETS"),
+)
+RUN_TIME_CENTER = (664, 655)
+RUN_TIME_SIZE = 26
+
+
+class GlyphAtlas:
+    """
+    按字号缓存已栅格化的字形，绘制文字时直接贴字形蒙版，不再逐次调用 FreeType。
+    玩家名和数字只涉及很少的字符，缓存很快就会全部命中。
+    """
+
+    def __init__(self, font_path: str, size: int):
+        self.font = ImageFont.truetype(font_path, size)
+        self.size = size
+        ascent, descent = self.font.getmetrics()
+        self.line_height = ascent + descent
+        # 字符 -> (字形蒙版, 阴影蒙版, 相对位置, 步进宽度)
+        self._glyphs: dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def glyph(self, char: str) -> tuple:
+        cached = self._glyphs.get(char)
+        if cached is not None:
+            return cached
+        with self._lock:
+            left, top, right, bottom = self.font.getbbox(char, anchor="la")
+            mask = shadow = None
+            if right > left and bottom > top:
+                mask = Image.new("L", (right - left, bottom - top))
+                ImageDraw.Draw(mask).text((-left, -top), char, fill=255, font=self.font, anchor="la")
+                shadow = mask.point(lambda v: int(v * TEXT_SHADOW[1]))
+            cached = (mask, shadow, (left, top), self.font.getlength(char))
+            self._glyphs[char] = cached
+        return cached
+
+    def width(self, text: str) -> float:
+        return sum(self.glyph(char)[3] for char in text)
+
+    def fit(self, text: str, max_width: float) -> str:
+        # 超出宽度时截断并加省略号，与 CSS 的 text-overflow: ellipsis 一致
+        if self.width(text) <= max_width:
+            return text
+        while text and self.width(text + "...") > max_width:
+            text = text[:-1]
+        return text + "..."
+
+    def draw(self, image: Image.Image, position: tuple[float, float], text: str, fill=TEXT_COLOR):
+        offset = TEXT_SHADOW[0]
+        x, y = position
+        for char in text:
+            mask, shadow, (left, top), advance = self.glyph(char)
+            if mask is not None:
+                box = (round(x + left), round(y + top))
+                image.paste((0, 0, 0), (box[0], box[1] + offset), shadow)
+                image.paste(fill, box, mask)
+            x += advance
+
+    def draw_centered(self, image: Image.Image, center: tuple[float, float], text: str, fill=TEXT_COLOR):
+        x, y = center
+        self.draw(image, (x - self.width(text) / 2, y - self.line_height / 2), text, fill)
+
+
+_atlases: dict[int, GlyphAtlas] = {}
+_atlas_lock = threading.Lock()
+
+def atlas(size: int) -> GlyphAtlas:
+    with _atlas_lock:
+        if size not in _atlases:
+            _atlases[size] = GlyphAtlas(os.path.join(ASSETS_DIR, FONT_FILE), size)
+        return _atlases[size]
+
+
+def _drop_shadow(layer: Image.Image, image: Image.Image, position: tuple[int, int], offset: int, opacity: float):
+    shadow = image.getchannel("A").point(lambda v: int(v * opacity))
+    layer.paste((0, 0, 0), (position[0], position[1] + offset), shadow)
+
+
+def _background() -> Image.Image:
+    # object-fit: cover 后再放大 1.03 倍，居中裁剪
+    width, height = CARD_SIZE
+    with Image.open(os.path.join(ASSETS_DIR, BACKGROUND_FILE)) as source:
+        background = source.convert("RGB")
+    scale = max(width / background.width, height / background.height) * 1.03
+    size = (round(background.width * scale), round(background.height * scale))
+    background = background.resize(size, Image.NEAREST)
+    left, top = (size[0] - width) // 2, (size[1] - height) // 2
+    return background.crop((left, top, left + width, top + height))
+
+
+def _shade(stops: list[tuple[float, float]], length: int) -> list[float]:
+    # 线性渐变：stops 为 (位置 0~1, 不透明度)
+    values = []
+    for index in range(length):
+        position = index / max(1, length - 1)
+        for (start, start_alpha), (end, end_alpha) in zip(stops, stops[1:]):
+            if start <= position <= end:
+                ratio = (position - start) / (end - start) if end > start else 0
+                values.append(start_alpha + (end_alpha - start_alpha) * ratio)
+                break
+        else:
+            values.append(stops[-1][1])
+    return values
+
+
+def _apply_shade(image: Image.Image, horizontal: list[tuple[float, float]], bottom: float):
+    width, height = image.size
+    shade_color = Image.new("RGB", image.size, (8, 10, 14))
+    row = Image.new("L", (width, 1))
+    row.putdata([int(alpha * 255) for alpha in _shade(horizontal, width)])
+    image.paste(shade_color, (0, 0), row.resize(image.size))
+    column = Image.new("L", (1, height))
+    column.putdata([int(alpha * 255) for alpha in reversed(_shade([(0, bottom), (0.32, 0), (1, 0)], height))])
+    image.paste(shade_color, (0, 0), column.resize(image.size))
+
+
+def _rows(layout: dict) -> list[int]:
+    return [layout["row_top"] + index * (layout["row_height"] + layout["row_gap"]) for index in range(len(SPLIT_ICONS))]
+
+
+def _build_base(template_name: str) -> Image.Image:
+    """
+    合成不随数据变化的部分：背景、遮罩、图标和概览栏底色。
+    """
+    layout = PACESTATS_LAYOUT if template_name == "pacestats" else RUN_LAYOUT
+    image = _background()
+    if template_name == "pacestats":
+        _apply_shade(image, [(0, 0.54), (0.55, 0.36), (1, 0.16)], 0.28)
+    else:
+        _apply_shade(image, [(0, 0.54), (0.55, 0.36), (1, 0.16)], 0.24)
+
+    icon_size = layout["icon_size"]
+    for key, top in zip(SPLIT_ICONS, _rows(layout)):
+        with Image.open(os.path.join(ASSETS_DIR, f"{key}.webp")) as source:
+            icon = source.convert("RGBA").resize((icon_size, icon_size), Image.NEAREST)
+        position = (layout["icon_x"], top + (layout["row_height"] - icon_size) // 2)
+        _drop_shadow(image, icon, position, 4, 0.34)
+        image.paste(icon, position, icon)
+
+    if template_name == "pacestats":
+        x, y, width, height = SUMMARY_BOX
+        overlay = Image.new("RGBA", CARD_SIZE, (0, 0, 0, 0))
+        draw = ImageDraw.Draw(overlay)
+        draw.rectangle((x, y, x + width, y + height), fill=(10, 12, 16, 87))
+        draw.rectangle((x, y, x + width, y + 1), fill=(255, 255, 255, 41))
+        draw.rectangle((x, y + height - 2, x + width, y + height), fill=(0, 0, 0, 61))
+        column = width // len(SUMMARY_LABELS)
+        for index in range(1, len(SUMMARY_LABELS)):
+            draw.rectangle((x + column * index - 2, y + 14, x + column * index, y + height - 14), fill=(255, 255, 255, 36))
+        image = Image.alpha_composite(image.convert("RGBA"), overlay).convert("RGB")
+    return image
+
+
+_bases: dict[str, tuple[tuple, Image.Image]] = {}
+_base_lock = threading.Lock()
+
+def base_image(template_name: str) -> Image.Image:
+    # 资源文件修改后重新合成
+    version = tuple(
+        os.stat(os.path.join(ASSETS_DIR, filename)).st_mtime_ns for filename in TEMPLATE_ASSETS
+    )
+    with _base_lock:
+        cached = _bases.get(template_name)
+        if cached is None or cached[0] != version:
+            cached = (version, _build_base(template_name))
+            _bases[template_name] = cached
+        return cached[1]
+
+
+def _paste_skin(image: Image.Image, skin: bytes | None, layout: dict):
+    if not skin:
+        return
+    try:
+        with Image.open(io.BytesIO(skin)) as source:
+            skin_image = source.convert("RGBA")
+    except Exception as e:
+        logger.info(f"绘制皮肤失败: {e}")
+        return
+    x, y, width, height = layout["skin_box"]
+    # object-fit: contain，顶部对齐、水平居中
+    scale = min(width / skin_image.width, height / skin_image.height)
+    size = (max(1, round(skin_image.width * scale)), max(1, round(skin_image.height * scale)))
+    skin_image = skin_image.resize(size, Image.LANCZOS)
+    position = (x + (width - size[0]) // 2, y)
+    _drop_shadow(image, skin_image, position, layout["skin_shadow"], 0.34)
+    image.paste(skin_image, position, skin_image)
+
+
+def _draw_rows(image: Image.Image, texts: list[str], layout: dict):
+    font = atlas(layout["font_size"])
+    for text, top in zip(texts, _rows(layout)):
+        font.draw(image, (layout["text_x"], top + (layout["row_height"] - font.line_height) / 2), text)
+
+
+def _draw_name(image: Image.Image, uname: str, layout: dict):
+    font = atlas(layout["name_size"])
+    name = font.fit(uname, layout["name_width"])
+    font.draw(image, (layout["name_center"] - font.width(name) / 2, layout["name_top"]), name, fill=(255, 255, 255))
+
+
+def _encode(image: Image.Image) -> bytes:
+    # 低压缩级别，编码耗时远小于默认级别，体积只略大
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", compress_level=1)
+    return buffer.getvalue()
+
+
+def render_pacestats_png(
+    uname: str,
+    data: UserSessionStats,
+    nph_stats: dict | None = None,
+    skin: bytes | None = None,
+) -> bytes:
+    """
+    与 pacestats.html 布局一致的 PIL 卡片，直接返回 PNG 数据。
+    """
+    render_data = session_render_data(data, nph_stats)
+    image = base_image("pacestats").copy()
+    _paste_skin(image, skin, PACESTATS_LAYOUT)
+    _draw_rows(
+        image,
+        [f"{render_data['stats'][key]['count']} {render_data['stats'][key]['avg']}" for key in SPLIT_ICONS],
+        PACESTATS_LAYOUT,
+    )
+    _draw_name(image, uname, PACESTATS_LAYOUT)
+
+    x, y, width, height = SUMMARY_BOX
+    column = width // len(SUMMARY_LABELS)
+    label_font, value_font = atlas(SUMMARY_LABEL_SIZE), atlas(SUMMARY_VALUE_SIZE)
+    for index, (key, label) in enumerate(SUMMARY_LABELS):
+        left = x + column * index + 24
+        label_font.draw(image, (left, y + 16), label, fill=(209, 209, 209))
+        value_font.draw(image, (left, y + 44), str(render_data["summary"][key]), fill=(255, 255, 255))
+    return _encode(image)
+
+
+def render_run_png(uname: str, run: RunStats, skin: bytes | None = None) -> bytes:
+    """
+    与 run.html 布局一致的 PIL 卡片，直接返回 PNG 数据。
+    """
+    render_data = run_render_data(run)
+    image = base_image("run").copy()
+    _paste_skin(image, skin, RUN_LAYOUT)
+    _draw_rows(image, [render_data["times"][key] for key in SPLIT_ICONS], RUN_LAYOUT)
+    _draw_name(image, uname, RUN_LAYOUT)
+    atlas(RUN_TIME_SIZE).draw_centered(image, RUN_TIME_CENTER, render_data["update_time"], fill=(204, 204, 204))
+    return _encode(image)
@@ -0,0 +1,280 @@
+import asyncio
+import time
+from contextlib import aclosing
+import httpx
+from astrbot.api import logger
+from .constant import *
+from .storage import SqliteStore
+from .utils import RUN_RECORD_FIELDS, fetch_api_data, iter_recent_runs
+
+
+class RunStore(SqliteStore):
+    """
+    玩家历史 run 的本地副本，按 (玩家, run id) 保存。
+    同步时以本地最大的 run id 为高水位，只请求比它更新的 run。
+    """
+
+    def _create_tables(self):
+        columns = ", ".join(f"{field} INTEGER" for field in RUN_RECORD_FIELDS if field != "id")
+        with self.conn:
+            self.conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS runs (
+                    username TEXT NOT NULL COLLATE NOCASE,
+                    id INTEGER NOT NULL,
+                    {columns},
+                    PRIMARY KEY (username, id)
+                )
+                """
+            )
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS run_sync (
+                    username TEXT PRIMARY KEY COLLATE NOCASE,
+                    synced_at REAL NOT NULL
+                )
+                """
+            )
+
+    def high_water(self, username: str) -> int | None:
+        row = self.conn.execute(
+            "SELECT MAX(id) FROM runs WHERE username = ?", (username,)
+        ).fetchone()
+        return row[0]
+
+    def upsert_runs(self, username: str, runs: list[dict]):
+        fields = ", ".join(RUN_RECORD_FIELDS)
+        placeholders = ", ".join("?" for _ in RUN_RECORD_FIELDS)
+        updates = ", ".join(f"{field} = excluded.{field}" for field in RUN_RECORD_FIELDS if field != "id")
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT INTO runs (username, {fields}) VALUES (?, {placeholders}) "
+                f"ON CONFLICT(username, id) DO UPDATE SET {updates}",
+                [(username, *(run.get(field) for field in RUN_RECORD_FIELDS)) for run in runs],
+            )
+            self.conn.execute(
+                "INSERT INTO run_sync (username, synced_at) VALUES (?, ?) "
+                "ON CONFLICT(username) DO UPDATE SET synced_at = excluded.synced_at",
+                (username, time.time()),
+            )
+
+    def synced_at(self, username: str) -> float | None:
+        row = self.conn.execute(
+            "SELECT synced_at FROM run_sync WHERE username = ?", (username,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def count(self, username: str) -> int:
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM runs WHERE username = ?", (username,)
+        ).fetchone()[0]
+
+    def latest_finished(self, username: str) -> dict | None:
+        row = self.conn.execute(
+            f"SELECT {', '.join(RUN_RECORD_FIELDS)} FROM runs "
+            "WHERE username = ? AND finish IS NOT NULL AND finish > 0 ORDER BY id DESC LIMIT 1",
+            (username,),
+        ).fetchone()
+        return dict(row) if row else None
+
+    def prune(self, keep: set[str], max_age: float) -> int:
+        """
+        删除超过 max_age 秒没有同步过、且不在 keep 中的玩家的历史，返回删除的玩家数。
+        """
+        keep = {username.lower() for username in keep}
+        cutoff = time.time() - max_age
+        stale = [
+            row["username"]
+            for row in self.conn.execute(
+                "SELECT username FROM run_sync WHERE synced_at < ?", (cutoff,)
+            ).fetchall()
+            if row["username"].lower() not in keep
+        ]
+        with self.conn:
+            for username in stale:
+                self.conn.execute("DELETE FROM runs WHERE username = ?", (username,))
+                self.conn.execute("DELETE FROM run_sync WHERE username = ?", (username,))
+        return len(stale)
+
+    def columns(self, username: str, fields: tuple) -> dict[str, list]:
+        """
+        按列返回玩家的 run（从旧到新）。
+        """
+        rows = self.conn.execute(
+            f"SELECT {', '.join(fields)} FROM runs WHERE username = ? ORDER BY id", (username,)
+        ).fetchall()
+        return {field: [row[index] for row in rows] for index, field in enumerate(fields)}
+
+
+class MatchStore(SqliteStore):
+    """
+    Ranked 比赛记录的本地副本，按 (玩家 uuid, match id) 保存。
+    同步时以本地最大的 match id 为游标，只请求之后的新比赛。
+    """
+
+    def _create_tables(self):
+        with self.conn:
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ranked_matches (
+                    uuid TEXT NOT NULL,
+                    id INTEGER NOT NULL,
+                    date INTEGER NOT NULL,
+                    elo_rate INTEGER,
+                    elo_change INTEGER,
+                    won INTEGER,
+                    forfeited INTEGER NOT NULL DEFAULT 0,
+                    time INTEGER,
+                    PRIMARY KEY (uuid, id)
+                )
+                """
+            )
+
+    def high_water(self, uuid: str) -> int | None:
+        row = self.conn.execute(
+            "SELECT MAX(id) FROM ranked_matches WHERE uuid = ?", (uuid,)
+        ).fetchone()
+        return row[0]
+
+    def upsert_matches(self, uuid: str, matches: list[dict]):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO ranked_matches "
+                "(uuid, id, date, elo_rate, elo_change, won, forfeited, time) "
+                "VALUES (:uuid, :id, :date, :elo_rate, :elo_change, :won, :forfeited, :time)",
+                [{"uuid": uuid} | match for match in matches],
+            )
+
+    def recent(self, uuid: str, limit: int) -> list[dict]:
+        """
+        最近 limit 场比赛，按时间从旧到新。
+        """
+        rows = self.conn.execute(
+            "SELECT * FROM (SELECT * FROM ranked_matches WHERE uuid = ? ORDER BY id DESC LIMIT ?) "
+            "ORDER BY id",
+            (uuid, limit),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+
+def match_record(match: dict, uuid: str) -> dict:
+    """
+    从 Ranked API 的比赛数据中取出该玩家需要保存的字段。
+    changes 中的 eloRate 是赛前分数，赛后分数为 eloRate + change。
+    """
+    change = next((c for c in match.get("changes") or [] if c.get("uuid") == uuid), {})
+    result = match.get("result") or {}
+    winner = result.get("uuid")
+    forfeited = bool(match.get("forfeited"))
+    won = None if winner is None else int(winner == uuid)
+    return {
+        "id": match["id"],
+        "date": match.get("date") or 0,
+        "elo_rate": change.get("eloRate"),
+        "elo_change": change.get("change"),
+        "won": won,
+        "forfeited": int(forfeited),
+        # 只有自己完成的比赛才有有效的完成时间
+        "time": result.get("time") if won and not forfeited else None,
+    }
+
+
+# 同一玩家同时只进行一次同步，其余请求等待同一个结果
+_syncing: dict[tuple, asyncio.Task] = {}
+
+
+async def _coalesced(key: tuple, factory):
+    task = _syncing.get(key)
+    if task is None:
+        task = asyncio.create_task(factory())
+        _syncing[key] = task
+        task.add_done_callback(lambda _: _syncing.pop(key, None))
+    return await asyncio.shield(task)
+
+
+async def sync_runs(
+    store: RunStore,
+    username: str,
+    client: httpx.AsyncClient | None = None,
+) -> int:
+    """
+    把玩家比本地高水位更新的 run 写入本地，返回写入的数量。
+    最新的一条 run 可能仍在进行中，所以高水位那一条会重新写入一次。
+    """
+    return await _coalesced(
+        ("runs", username.lower()), lambda: _sync_runs(store, username, client)
+    )
+
+
+async def _sync_runs(store: RunStore, username: str, client: httpx.AsyncClient | None) -> int:
+    high_water = store.high_water(username)
+    new_runs = []
+    async with aclosing(iter_recent_runs(username, client)) as runs:
+        async for run in runs:
+            if high_water is not None and run["id"] < high_water:
+                break
+            new_runs.append(run)
+    if new_runs or store.synced_at(username) is None:
+        store.upsert_runs(username, new_runs)
+    logger.debug(f"{username} 同步了 {len(new_runs)} 条 run，高水位 {high_water}")
+    return len(new_runs)
+
+
+async def latest_finished_run(
+    store: RunStore,
+    username: str,
+    client: httpx.AsyncClient | None = None,
+) -> tuple[dict | None, bool]:
+    """
+    查找玩家最近一次完成的 run，返回 (run, 是否有任何 run)。
+    已有本地历史时增量同步后读本地；否则从最新的 run 往前翻，找到第一条完成的就停止，
+    不做完整回填，也不写入本地（完整回填只在 /splits 中进行）。
+    """
+    if store.synced_at(username) is not None:
+        try:
+            await sync_runs(store, username, client)
+        except Exception as e:
+            # 上游不可用时使用本地记录
+            logger.info(f"同步 {username} 的 run 失败，使用本地记录: {e}")
+        return store.latest_finished(username), store.count(username) > 0
+    found_any = False
+    async with aclosing(iter_recent_runs(username, client)) as runs:
+        async for run in runs:
+            found_any = True
+            if run.get("finish"):
+                return run, True
+    return None, found_any
+
+
+async def sync_matches(
+    store: MatchStore,
+    uuid: str,
+    client: httpx.AsyncClient | None = None,
+) -> int:
+    """
+    把玩家比本地游标更新的 Ranked 比赛写入本地，返回写入的数量。
+    已有记录时通常只需要一次很小的增量请求；首次同步最多翻 RANKED_HISTORY_PAGES 页。
+    """
+    return await _coalesced(("matches", uuid), lambda: _sync_matches(store, uuid, client))
+
+
+async def _sync_matches(store: MatchStore, uuid: str, client: httpx.AsyncClient | None) -> int:
+    high_water = store.high_water(uuid)
+    before = None
+    total = 0
+    for page in range(RANKED_HISTORY_PAGES):
+        data = await fetch_api_data(
+            "ranked", "matches", uuid,
+            timeout=RANKED_MATCHES_TIMEOUT, client=client,
+            params={"count": RANKED_MATCH_PAGE_SIZE, "after": high_water, "before": before},
+        )
+        if not data or data.get("status") != "success":
+            break
+        matches = data.get("data") or []
+        store.upsert_matches(uuid, [match_record(match, uuid) for match in matches])
+        total += len(matches)
+        if len(matches) < RANKED_MATCH_PAGE_SIZE:
+            break
+        before = min(match["id"] for match in matches)
+    logger.debug(f"{uuid} 同步了 {total} 场 Ranked 比赛，游标 {high_water}")
+    return total
@@ -0,0 +1,132 @@
+import asyncio
+from datetime import datetime
+from typing import NamedTuple
+import httpx
+from astrbot.api import logger
+from astrbot.api.all import Star
+from .constant import *
+from .paceman import UserSessionStats, common_template_data, render_template_card
+from .utils import fetch_api_data, parse_time
+
+# 排序方式：key -> (显示名称, 排序函数)，排序函数的返回值越小越靠前
+LEADERBOARD_SORTS = {
+    "nether": ("下界数量", lambda s: (-s.nether.count, parse_time(s.nether.avg))),
+    "finish": ("完成数量", lambda s: (-s.finish.count, parse_time(s.finish.avg), -s.nether.count)),
+    "avg": ("下界平均时间", lambda s: (parse_time(s.nether.avg), -s.nether.count)),
+}
+# 排行榜为空时的提示，按完成排序时只保留完成过的玩家
+LEADERBOARD_EMPTY_TEXT = {
+    "nether": "过去24小时没有玩家进入下界",
+    "finish": "过去24小时没有玩家完成",
+    "avg": "过去24小时没有玩家进入下界",
+}
+LEADERBOARD_SORT_ALIASES = {
+    "下界": "nether",
+    "完成": "finish",
+    "平均": "avg",
+}
+
+
+class LeaderboardEntry(NamedTuple):
+    username: str
+    stats: UserSessionStats
+
+
+def resolve_sort_key(sort_key: str | None) -> str | None:
+    if not sort_key:
+        return "nether"
+    sort_key = LEADERBOARD_SORT_ALIASES.get(sort_key, sort_key.lower())
+    return sort_key if sort_key in LEADERBOARD_SORTS else None
+
+
+async def fetch_leaderboard(
+    usernames: list[str],
+    client: httpx.AsyncClient | None = None,
+    concurrency: int = LEADERBOARD_CONCURRENCY,
+    spread: float = 0.0,
+) -> list[LeaderboardEntry]:
+    """
+    并发获取所有玩家的 24 小时数据，单个玩家失败或没有数据时跳过。
+    spread 大于 0 时把请求均匀分散在这段时间（秒）内发出，避免瞬间打满上游。
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    interval = spread / len(usernames) if usernames and spread > 0 else 0.0
+
+    async def fetch_one(index: int, username: str) -> LeaderboardEntry | None:
+        if interval:
+            await asyncio.sleep(index * interval)
+        async with semaphore:
+            try:
+                data = await fetch_api_data(
+                    "paceman", "session_stats", username,
+                    timeout=SESSION_TIMEOUT, client=client,
+                )
+                if not data or not data.get("nether"):
+                    return None
+                return LeaderboardEntry(username, UserSessionStats(**data))
+            except Exception as e:
+                logger.info(f"获取 {username} 的排行榜数据失败: {e}")
+                return None
+
+    results = await asyncio.gather(
+        *(fetch_one(index, username) for index, username in enumerate(usernames))
+    )
+    return [entry for entry in results if entry is not None and entry.stats.nether.count > 0]
+
+
+def sort_leaderboard(entries: list[LeaderboardEntry], sort_key: str) -> list[LeaderboardEntry]:
+    _, key_func = LEADERBOARD_SORTS[sort_key]
+    if sort_key == "finish":
+        entries = [entry for entry in entries if entry.stats.finish.count > 0]
+    return sorted(entries, key=lambda entry: key_func(entry.stats))
+
+
+def leaderboard_render_data(
+    entries: list[LeaderboardEntry],
+    sort_key: str,
+    title: str,
+) -> dict:
+    sort_label, _ = LEADERBOARD_SORTS[sort_key]
+    rows = [
+        {
+            "rank": rank,
+            "uname": entry.username,
+            "nether_count": entry.stats.nether.count,
+            "nether_avg": entry.stats.nether.avg,
+            "finish_count": entry.stats.finish.count,
+            "finish_avg": entry.stats.finish.avg,
+        }
+        for rank, entry in enumerate(entries[:LEADERBOARD_SIZE], start=1)
+    ]
+    return common_template_data("", include_assets=False) | {
+        "title": title,
+        "sort_label": sort_label,
+        "total": len(entries),
+        "rows": rows,
+        "empty_text": LEADERBOARD_EMPTY_TEXT[sort_key],
+        "update_time": datetime.now().strftime("%Y-%m-%d %H:%M"),
+    }
+
+
+def leaderboard_text(entries: list[LeaderboardEntry], sort_key: str, title: str) -> str:
+    sort_label, _ = LEADERBOARD_SORTS[sort_key]
+    lines = [f"{title}（按{sort_label}排序）"]
+    for rank, entry in enumerate(entries[:LEADERBOARD_SIZE], start=1):
+        lines.append(
+            f"{rank}. {entry.username} 下界:{entry.stats.nether.count}({entry.stats.nether.avg}) "
+            f"完成:{entry.stats.finish.count}({entry.stats.finish.avg})"
+        )
+    if not entries:
+        lines.append(LEADERBOARD_EMPTY_TEXT[sort_key])
+    return "\n".join(lines)
+
+
+async def render_leaderboard(
+    star: Star,
+    entries: list[LeaderboardEntry],
+    sort_key: str,
+    title: str,
+) -> str | None:
+    return await render_template_card(
+        star, "leaderboard", leaderboard_render_data(entries, sort_key, title)
+    )
@@ -0,0 +1,136 @@
+import asyncio
+import time
+
+# 各上游的准入预算：最大并发数、每秒请求数、突发容量
+UPSTREAM_LIMITS = {
+    "paceman": {"max_concurrency": 16, "rate": 20.0, "burst": 40},
+    "ranked": {"max_concurrency": 4, "rate": 2.0, "burst": 5},
+    "crafty": {"max_concurrency": 4, "rate": 3.0, "burst": 6},
+    "renderer": {"max_concurrency": 2, "rate": 2.0, "burst": 4},
+}
+
+
+class TokenBucket:
+    """
+    令牌桶限速器，令牌不足时排队等待而不是直接失败。
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        # 持锁等待保证先到先得
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+class UpstreamLimiter:
+    """
+    单个上游的准入控制：信号量限制并发，令牌桶限制请求速率。
+    用法: async with upstream("paceman"): ...
+    """
+
+    def __init__(self, name: str, max_concurrency: int, rate: float, burst: int):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._bucket = TokenBucket(rate, burst)
+        self.in_flight = 0
+        self.waiting = 0
+
+    async def __aenter__(self):
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+            try:
+                await self._bucket.acquire()
+            except BaseException:
+                self._semaphore.release()
+                raise
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.in_flight -= 1
+        self._semaphore.release()
+        return False
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_concurrency": self.max_concurrency,
+        }
+
+
+_limiters = {name: UpstreamLimiter(name, **limits) for name, limits in UPSTREAM_LIMITS.items()}
+
+
+def upstream(name: str) -> UpstreamLimiter:
+    if name not in _limiters:
+        raise ValueError(f"未配置的上游: {name}")
+    return _limiters[name]
+
+
+def upstream_stats() -> dict:
+    return {name: limiter.stats() for name, limiter in _limiters.items()}
+
+
+class CircuitBreaker:
+    """
+    连续失败达到阈值后熔断，熔断期间直接拒绝请求。
+    冷却时间过后放行一个探测请求，成功则恢复，失败则继续熔断。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        now = time.monotonic()
+        if now - self._opened_at >= self.reset_timeout:
+            # 只放行一个探测请求，其余请求在结果出来之前继续被拒绝；
+            # 探测请求被取消而没有结果时，再过一个冷却周期重新探测
+            self.state = self.HALF_OPEN
+            self._opened_at = now
+            return True
+        return False
+
+    @property
+    def is_open(self) -> bool:
+        # 只读状态，不会像 allow() 那样把熔断切换成探测状态
+        return self.state == self.OPEN
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
@@ -1,23 +1,82 @@
 import asyncio
 import httpx
 import json
-from astrbot.api.event import filter, AstrMessageEvent
+from astrbot.api.event import filter, AstrMessageEvent, MessageChain
 from astrbot.api.star import Context, Star, register
 import astrbot.api.message_components as Comp
-from astrbot.api import logger
+from astrbot.api import logger, AstrBotConfig
 from .paceman import *
 from .utils import *
+from .limiter import upstream_stats
+from .cache import remove_legacy_skins
+from .storage import PlayerStore, ScheduleStore, WatchStore
+from .scheduler import BroadcastScheduler
+from .watcher import PaceWatcher
+from .history import MatchStore, RunStore, latest_finished_run, sync_matches, sync_runs
+from .leaderboard import *
+from .splits import render_splits, splits_render_data, splits_text
+from .rankcard import rank_render_data, render_rank
+from .ranked import parse_ranked_user, ranked_summary, ranked_text
+from .compare import compare_text, fetch_compare_entries, render_compare
+from .fastcard import render_pacestats_png, render_run_png
 
 
 PLAYER_DATA_FILE = "data/astrbot-pacemanbot.json"
+PLAYER_DB_FILE = "data/astrbot-pacemanbot.db"
+DAILY_LEADERBOARD_TITLE = "PaceMan 每日排行榜"
 
 @register("pacemanbot", "Mo_An", "支持查询我的世界速通数据", "1.4.0")
 class PaceManPlugin(Star):
-    def __init__(self, context: Context):
+    def __init__(self, context: Context, config: AstrBotConfig):
         super().__init__(context)
-        self.semaphore = asyncio.Semaphore(10)
-        self.player_data=load_data(PLAYER_DATA_FILE)
+        # html：浏览器渲染并在失败时回退到 PIL；fast：只用 PIL，不启动浏览器
+        self.render_mode = config.get("render_mode", RENDER_MODE_HTML)
+        set_render_mode(self.render_mode)
+        # 所有 PaceMan、Ranked、皮肤请求共用的连接池
+        self.http_client = create_http_client()
+        # 预先编码模板静态资源，首次渲染不再读盘
+        asset_bundle()
+        # 旧版本把皮肤保存为 public/<玩家名>.webp，迁移到皮肤缓存后一次性清理
+        removed = remove_legacy_skins(ASSETS_DIR, TEMPLATE_ASSETS)
+        if removed:
+            logger.info(f"清理了 {removed} 个旧版皮肤文件")
+        # 旧版 JSON 数据在首次启动时自动迁移到 SQLite
+        self.players = PlayerStore(PLAYER_DB_FILE, legacy_json_path=PLAYER_DATA_FILE)
+        # 玩家历史 run 的本地副本，每次查询只增量同步新的 run
+        self.runs = RunStore(PLAYER_DB_FILE)
+        self.matches = MatchStore(PLAYER_DB_FILE)
         self.message_target = None
+        # 恢复重启前设置的定时播报
+        self.scheduler = BroadcastScheduler(
+            ScheduleStore(PLAYER_DB_FILE),
+            prepare=self.prepare_daily_leaderboard,
+            send=lambda schedule, prepared: self.send_daily_leaderboard(
+                schedule["target"], schedule["group_id"], prepared
+            ),
+            lead=BROADCAST_PREPARE_LEAD,
+        )
+        self.scheduler.start_all()
+        # 所有 /watch 订阅共用一个后台轮询任务
+        self.watcher = PaceWatcher(
+            WatchStore(PLAYER_DB_FILE),
+            notify=lambda target, text: self.context.send_message(
+                target, MessageChain().message(text)
+            ),
+            client=self.http_client,
+        )
+        self.watcher.start()
+        self.prune_run_history()
+
+    def prune_run_history(self):
+        # 注册和关注的玩家一直保留，其他玩家的历史超过有效期就删除
+        keep = set(self.players.usernames()) | set(self.watcher.store.usernames())
+        removed = self.runs.prune(keep, RUN_HISTORY_TTL)
+        if removed:
+            logger.info(f"删除了 {removed} 名玩家过期的 run 历史")
+
+    def leaderboard_usernames(self, group_id: str | None) -> list[str]:
+        # 群聊只统计本群注册的玩家和没有群记录的旧玩家，私聊统计全部玩家
+        return self.players.usernames(group_id or None)
 
     # 提示用法
     @filter.command("bothelp")
@@ -25,34 +84,28 @@ class PaceManPlugin(Star):
         plain_result=("可使用的指令有\n/register 用户名-注册\n"
                       "/paceman [用户名]-查询24小时PaceMan数据\n"
                       "/run [用户名]-查询最近一次完成的速通数据\n"
+                      "/splits [用户名]-历史run的分段统计\n"
+                      "/compare 玩家1 玩家2 [玩家3 玩家4]-对比多名玩家的24小时数据\n"
                       "/rank [用户名]-查询MCSR Ranked数据\n"
+                      "/leaderboard [下界|完成|平均]-本群注册玩家的24小时排行榜\n"
+                      "/watch 用户名、/unwatch 用户名、/watchlist-订阅玩家的实时pace推送\n"
+                      "/start、/settime 时 分、/stop-管理员开启、设置、关闭每日排行榜播报\n"
                       "本插件基于Astrbot开发，如有建议请联系墨安QQ:2686014341或者去github上提issue\n"
                       "仓库地址：https://github.com/FXMoAn/astrbot_plugin_pacemanbot")
         yield event.plain_result(plain_result)
 
-    def get_user_data(self, userid, username):
-        if userid not in self.player_data:
-            self.player_data[userid] = {
-                "username":username,
-                "nether_count": 0,
-                "gg_count": 0,
-                "gg_avg": "0:00"
-            }
-        else:
-            self.player_data[userid]['username'] = username
-        return self.player_data[userid]
-
     # 将用户添加到列表中
     @filter.command("register")
     async def register(self, event: AstrMessageEvent, username:str):
         try:
             userid = event.get_sender_id()
-            # username = self.player_data[userid]['username']
-            data = await fetch_api_data("paceman", "session_stats", username)
+            data = await fetch_api_data("paceman", "session_stats", username, client=self.http_client)
             if data['nether']:
                 # 判断是否有数据
-                self.get_user_data(userid, username)
-                save_data(PLAYER_DATA_FILE, self.player_data)
+                self.players.upsert(userid, username)
+                group_id = event.get_group_id()
+                if group_id:
+                    self.players.add_group(userid, group_id)
                 yield event.plain_result(f"{userid}注册成功，当前游戏名为{username}")
             else:
                 yield event.plain_result("Paceman没有找到该用户，无法注册")
@@ -65,17 +118,33 @@ class PaceManPlugin(Star):
         try:
             if name is None:
                 userid = event.get_sender_id()
-                if userid not in self.player_data.keys():
+                username = self.players.get_username(userid)
+                if username is None:
                     yield event.plain_result("请先使用 '/register 用户名' 命令注册")
                     return
-                username = self.player_data[userid]['username']
             else:
                 username = name
             
-            sessiondata = await fetch_api_data("paceman", "session_stats", username)
-            nphdata = await fetch_api_data("paceman", "nph_stats", username)
+            # 三个请求互不依赖，同时发出；NPH 和皮肤失败时只影响对应字段
+            sessiondata, nphdata, skin = await asyncio.gather(
+                fetch_api_data(
+                    "paceman", "session_stats", username,
+                    timeout=SESSION_TIMEOUT, client=self.http_client,
+                ),
+                fetch_optional(
+                    fetch_api_data(
+                        "paceman", "nph_stats", username,
+                        timeout=NPH_TIMEOUT, client=self.http_client,
+                    ),
+                    NPH_TIMEOUT, {}, "获取NPH数据",
+                ),
+                fetch_optional(
+                    fetch_skin_bytes(username, self.http_client, timeout=SKIN_TIMEOUT),
+                    SKIN_TIMEOUT, None, "获取皮肤",
+                ),
+            )
             data = UserSessionStats(**sessiondata)
-            render = Renderer(self, username, data, nphdata)
+            render = Renderer(self, username, data, nphdata, skin_uri=skin_data_uri(skin))
             if data.nether:
                 sessionresult=(f"{username}\n"
                         f"下界数量:{data.nether.count},平均时间:{data.nether.avg}\n"
@@ -85,20 +154,27 @@ class PaceManPlugin(Star):
                         f"要塞数量:{data.stronghold.count},平均时间:{data.stronghold.avg}\n"
                         f"末地数量:{data.end.count},平均时间:{data.end.avg}\n"
                         f"完成数量:{data.finish.count},平均时间:{data.finish.avg}")
+                render_output = None
                 try:
-                    render_output = await render.render_dynamic(template_name="pacestats")
-                    if not render_output:
-                        logger.info("HTML render failed, falling back to PIL renderer.")
-                        service = Paceman(username, data)
-                        service.generate_image()
-                        render_output = result_image_path()
+                    if self.render_mode != RENDER_MODE_FAST:
+                        render_output = await render.render_dynamic(template_name="pacestats")
+                    if render_output:
+                        image = Comp.Image.fromFileSystem(render_output)
+                    else:
+                        if self.render_mode != RENDER_MODE_FAST:
+                            logger.info("HTML render failed, falling back to PIL renderer.")
+                        image = Comp.Image.fromBytes(await render_fallback(
+                            render_pacestats_png, username, data, nphdata, skin
+                        ))
                     chain = [
-                        Comp.Image.fromFileSystem(render_output),
+                        image,
                     ]
                     yield event.chain_result(chain)
                 except Exception as e:
                     logger.exception("Generate image error:")
                     yield event.plain_result(sessionresult)
+                finally:
+                    remove_render_output(render_output)
 
             else:
                 yield event.plain_result("没有找到该用户。")
@@ -119,19 +195,21 @@ class PaceManPlugin(Star):
         try:
             if name is None:
                 userid = event.get_sender_id()
-                if userid not in self.player_data.keys():
+                username = self.players.get_username(userid)
+                if username is None:
                     yield event.plain_result("请先使用 '/register 用户名' 命令注册")
                     return
-                username = self.player_data[userid]['username'] 
             else:
                 username = name
-            runs = await fetch_api_data("paceman", "recent_runs", username)
-            if runs:
-                recent_run=None
-                for run in runs:
-                    if run['finish']:
-                        recent_run=RunStats(**run)
-                        break
+            (latest_run, has_runs), skin = await asyncio.gather(
+                latest_finished_run(self.runs, username, self.http_client),
+                fetch_optional(
+                    fetch_skin_bytes(username, self.http_client, timeout=SKIN_TIMEOUT),
+                    SKIN_TIMEOUT, None, "获取皮肤",
+                ),
+            )
+            if has_runs:
+                recent_run = RunStats(**latest_run) if latest_run else None
                 if recent_run:
                     run_result=(f"{username}的最近一次速通数据:\n"
                             f"时间:{to_local_time(recent_run.updatedTime)}\n"
@@ -142,22 +220,29 @@ class PaceManPlugin(Star):
                             f"要塞:{get_time(recent_run.stronghold)[0]}:{get_time(recent_run.stronghold)[1]:02d}\n"
                             f"末地:{get_time(recent_run.end)[0]}:{get_time(recent_run.end)[1]:02d}\n"
                             f"完成:{get_time(recent_run.finish)[0]}:{get_time(recent_run.finish)[1]:02d}\n")
+                    render_output = None
                     try:
-                        run_service = RunRenderer(self, username, recent_run)
-                        render_output = await run_service.render_dynamic(template_name="run")
-                        if not render_output:
-                            logger.info("HTML render failed, falling back to PIL renderer.")
-                            fallback_service = Run(recent_run, username)
-                            fallback_service.generate_image()
-                            render_output = result_image_path()
+                        if self.render_mode != RENDER_MODE_FAST:
+                            run_service = RunRenderer(self, username, recent_run, skin_uri=skin_data_uri(skin))
+                            render_output = await run_service.render_dynamic(template_name="run")
+                        if render_output:
+                            image = Comp.Image.fromFileSystem(render_output)
+                        else:
+                            if self.render_mode != RENDER_MODE_FAST:
+                                logger.info("HTML render failed, falling back to PIL renderer.")
+                            image = Comp.Image.fromBytes(await render_fallback(
+                                render_run_png, username, recent_run, skin
+                            ))
                         chain = [
                             Comp.Plain(f"{username}的最近一次速通数据:"),
-                            Comp.Image.fromFileSystem(render_output),
+                            image,
                         ]
                         yield event.chain_result(chain)
                     except Exception as e:
                         logger.exception("Generate image error:")
                         yield event.plain_result(run_result)
+                    finally:
+                        remove_render_output(render_output)
                 else:
                     yield event.plain_result("该玩家最近没有完成的run")
             else:
@@ -174,21 +259,282 @@ class PaceManPlugin(Star):
             logger.exception("Run command error:")
             yield event.plain_result(f"发生未知错误: {e}")
 
+    # 基于本地历史 run 的分段统计
+    @filter.command("splits")
+    async def splits(self, event: AstrMessageEvent, name = None):
+        try:
+            if name is None:
+                username = self.players.get_username(event.get_sender_id())
+                if username is None:
+                    yield event.plain_result("请先使用 '/register 用户名' 命令注册")
+                    return
+            else:
+                username = name
+            synced, skin = await asyncio.gather(
+                sync_runs(self.runs, username, self.http_client),
+                fetch_optional(
+                    fetch_skin_bytes(username, self.http_client, timeout=SKIN_TIMEOUT),
+                    SKIN_TIMEOUT, None, "获取皮肤",
+                ),
+                return_exceptions=True,
+            )
+            if isinstance(synced, BaseException):
+                if not self.runs.count(username):
+                    raise synced
+                logger.info(f"同步 {username} 的 run 失败，使用本地记录: {synced}")
+            self.prune_run_history()
+            render_data = splits_render_data(username, self.runs.columns(username, SPLIT_ICONS))
+            if not render_data["rows"]["nether"]["count"]:
+                yield event.plain_result("该玩家还没有进入下界的run")
+                return
+            render_output = None
+            try:
+                render_output = await render_splits(self, render_data, skin_data_uri(skin))
+                if not render_output:
+                    yield event.plain_result(splits_text(username, render_data))
+                    return
+                yield event.chain_result([Comp.Image.fromFileSystem(render_output)])
+            except Exception as e:
+                logger.exception("Generate image error:")
+                yield event.plain_result(splits_text(username, render_data))
+            finally:
+                remove_render_output(render_output)
+        except httpx.HTTPStatusError as e:
+            yield event.plain_result(f"没有找到该用户")
+        except httpx.TimeoutException:
+            yield event.plain_result("超时，请稍后重试。")
+        except httpx.HTTPError as e:
+            yield event.plain_result(f"发生网络错误: {e}")
+        except Exception as e:
+            logger.exception("Splits command error:")
+            yield event.plain_result(f"发生未知错误: {e}")
+
+    # 多名玩家的24小时数据对比，只请求一轮数据、渲染一张卡片
+    @filter.command("compare")
+    async def compare(self, event: AstrMessageEvent, player1: str, player2: str, player3: str = None, player4: str = None):
+        usernames = []
+        for username in (player1, player2, player3, player4):
+            if username and username.lower() not in (name.lower() for name in usernames):
+                usernames.append(username)
+        usernames = usernames[:COMPARE_MAX_PLAYERS]
+        if len(usernames) < 2:
+            yield event.plain_result("请至少输入两个不同的玩家，例如 /compare 玩家1 玩家2")
+            return
+        entries = await fetch_compare_entries(usernames, self.http_client)
+        missing = [entry.username for entry in entries if entry.stats is None]
+        entries = [entry for entry in entries if entry.stats is not None]
+        if len(entries) < 2:
+            yield event.plain_result("可对比的玩家不足两名，请确认用户名并且玩家在过去24小时内有数据")
+            return
+        notice = f"以下玩家没有数据：{'、'.join(missing)}" if missing else None
+        render_output = None
+        try:
+            render_output = await render_compare(self, entries)
+            if not render_output:
+                yield event.plain_result("\n".join(filter(None, [compare_text(entries), notice])))
+                return
+            chain = [Comp.Image.fromFileSystem(render_output)]
+            if notice:
+                chain.insert(0, Comp.Plain(notice))
+            yield event.chain_result(chain)
+        except Exception as e:
+            logger.exception("Generate image error:")
+            yield event.plain_result("\n".join(filter(None, [compare_text(entries), notice])))
+        finally:
+            remove_render_output(render_output)
+
+    # 本群注册玩家的24小时排行榜
+    @filter.command("leaderboard")
+    async def leaderboard(self, event: AstrMessageEvent, sort = None):
+        sort_key = resolve_sort_key(sort)
+        if sort_key is None:
+            yield event.plain_result("排序方式只能是 下界、完成 或 平均")
+            return
+        group_id = event.get_group_id()
+        usernames = self.leaderboard_usernames(group_id)
+        if not usernames:
+            if group_id:
+                yield event.plain_result("本群还没有玩家注册，请先使用 '/register 用户名' 命令注册")
+            else:
+                yield event.plain_result("还没有玩家注册，请先使用 '/register 用户名' 命令注册")
+            return
+
+        entries = sort_leaderboard(
+            await fetch_leaderboard(usernames, self.http_client), sort_key
+        )
+        title = "PaceMan 24小时排行榜"
+        render_output = None
+        try:
+            render_output = await render_leaderboard(self, entries, sort_key, title)
+            if render_output:
+                yield event.chain_result([Comp.Image.fromFileSystem(render_output)])
+            else:
+                yield event.plain_result(leaderboard_text(entries, sort_key, title))
+        except Exception as e:
+            logger.exception("Leaderboard command error:")
+            yield event.plain_result(leaderboard_text(entries, sort_key, title))
+        finally:
+            remove_render_output(render_output)
+
+    # 查看缓存命中情况
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("cachestats")
+    async def cachestats(self, event: AstrMessageEvent):
+        stats = api_cache.stats()
+        card_stats = card_cache.stats()
+        skin_stats = skin_cache.stats()
+        yield event.plain_result(
+            f"API缓存: {stats['size']}条\n"
+            f"命中:{stats['hits']} 合并:{stats['coalesced']} 未命中:{stats['misses']}\n"
+            f"命中率:{stats['hit_rate']*100:.1f}%\n"
+            f"卡片缓存: {card_stats['size']}张 {card_stats['bytes'] / 1024 / 1024:.1f}MB\n"
+            f"命中:{card_stats['hits']} 未命中:{card_stats['misses']}\n"
+            f"皮肤缓存: {skin_stats['size']}个 {skin_stats['bytes'] / 1024 / 1024:.1f}MB "
+            f"负缓存:{skin_stats['negative']}\n"
+            f"渲染服务熔断状态: {render_breaker.state}\n"
+            + "\n".join(
+                f"{name}: 进行中{s['in_flight']}/{s['max_concurrency']} 排队{s['waiting']}"
+                for name, s in upstream_stats().items()
+            )
+        )
+
+    # 在当前会话开启每日排行榜播报
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("start")
     async def start(self, event: AstrMessageEvent):
-        logger.info("Paceman scheduled broadcast has been removed.")
+        schedule = self.scheduler.get(event.unified_msg_origin)
+        hour, minute = (
+            (schedule["hour"], schedule["minute"]) if schedule else DEFAULT_BROADCAST_TIME
+        )
+        await self.send_scheduled_paceman_leaderboard(
+            hour, minute, event.unified_msg_origin, event.get_group_id()
+        )
+        yield event.plain_result(f"已开启定时播报，每天{hour:02d}:{minute:02d}发送排行榜")
 
+    # 修改当前会话的播报时间
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("settime")
     async def settime(self, event:AstrMessageEvent, hour:int, minute:int):
-        yield event.plain_result("定时播报功能已移除")
+        if not (0 <= hour < 24 and 0 <= minute < 60):
+            yield event.plain_result("时间格式错误，请使用 '/settime 时 分'，例如 /settime 22 0")
+            return
+        await self.send_scheduled_paceman_leaderboard(
+            hour, minute, event.unified_msg_origin, event.get_group_id()
+        )
+        yield event.plain_result(f"定时播报时间已设置为每天{hour:02d}:{minute:02d}")
 
+    # 关闭当前会话的播报
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("stop")
     async def stop(self, event:AstrMessageEvent):
-        yield event.plain_result("定时播报功能已移除")
+        if self.scheduler.remove(event.unified_msg_origin):
+            yield event.plain_result("已关闭定时播报")
+        else:
+            yield event.plain_result("当前会话没有开启定时播报")
 
-    async def send_scheduled_paceman_leaderboard(self,hour,minute,message_target):
-         logger.info("Paceman scheduled broadcast has been removed.")
-    
-    async def send_daily_leaderboard(self, message_target):
-        logger.info("Paceman scheduled broadcast has been removed.")
-        return "定时播报功能已移除"
+    # 订阅玩家的实时 pace，到达新阶段时推送到当前会话
+    @filter.command("watch")
+    async def watch(self, event: AstrMessageEvent, username: str):
+        target = event.unified_msg_origin
+        watched = self.watcher.store.usernames_for(target)
+        if username.lower() in (name.lower() for name in watched):
+            yield event.plain_result(f"已经订阅了 {username}")
+            return
+        if len(watched) >= WATCH_MAX_PER_TARGET:
+            yield event.plain_result(f"每个会话最多订阅 {WATCH_MAX_PER_TARGET} 名玩家")
+            return
+        self.watcher.add(username, target)
+        yield event.plain_result(f"已订阅 {username}，进入下界、要塞和完成时会推送到这里")
+
+    # 取消订阅
+    @filter.command("unwatch")
+    async def unwatch(self, event: AstrMessageEvent, username: str):
+        if self.watcher.remove(username, event.unified_msg_origin):
+            yield event.plain_result(f"已取消订阅 {username}")
+        else:
+            yield event.plain_result(f"当前会话没有订阅 {username}")
+
+    # 查看当前会话的订阅
+    @filter.command("watchlist")
+    async def watchlist(self, event: AstrMessageEvent):
+        watched = self.watcher.store.usernames_for(event.unified_msg_origin)
+        if watched:
+            yield event.plain_result("当前会话订阅的玩家：\n" + "\n".join(watched))
+        else:
+            yield event.plain_result("当前会话没有订阅任何玩家")
+
+    async def send_scheduled_paceman_leaderboard(self, hour, minute, message_target, group_id=None):
+        # 保存播报设置并（重新）启动该会话的后台任务
+        self.message_target = message_target
+        self.scheduler.set(message_target, group_id, hour, minute)
+        logger.info(f"定时播报已设置: {message_target} {hour:02d}:{minute:02d}")
+
+    async def prepare_daily_leaderboard(self, schedule: dict, window: float = 0.0):
+        """
+        在发送前获取并渲染排行榜，请求分散在 window 秒内发出。
+        返回 (图片路径或 None, 文字版排行榜, 前几名玩家的数据卡片路径)。
+        """
+        usernames = self.leaderboard_usernames(schedule.get("group_id"))
+        entries = sort_leaderboard(
+            await fetch_leaderboard(usernames, self.http_client, spread=window * 0.8),
+            "nether",
+        )
+        text = leaderboard_text(entries, "nether", DAILY_LEADERBOARD_TITLE)
+        try:
+            render_output = await render_leaderboard(
+                self, entries, "nether", DAILY_LEADERBOARD_TITLE
+            )
+        except Exception:
+            logger.exception("Render daily leaderboard error:")
+            render_output = None
+        try:
+            card_outputs = await self.render_top_cards(entries[:BROADCAST_TOP_CARDS])
+        except Exception:
+            logger.exception("Render daily top cards error:")
+            card_outputs = []
+        return render_output, text, card_outputs
+
+    async def render_top_cards(self, entries: list) -> list[str]:
+        # 前几名玩家的 pacestats 卡片在一个页面中批量渲染
+        async def fetch_extra(username: str):
+            return await asyncio.gather(
+                fetch_optional(
+                    fetch_api_data(
+                        "paceman", "nph_stats", username,
+                        timeout=NPH_TIMEOUT, client=self.http_client,
+                    ),
+                    NPH_TIMEOUT, {}, "获取NPH数据",
+                ),
+                fetch_optional(
+                    fetch_skin_bytes(username, self.http_client, timeout=SKIN_TIMEOUT),
+                    SKIN_TIMEOUT, None, "获取皮肤",
+                ),
+            )
+
+        extras = await asyncio.gather(*(fetch_extra(entry.username) for entry in entries))
+        renderers = [
+            Renderer(self, entry.username, entry.stats, nphdata, skin_uri=skin_data_uri(skin))
+            for entry, (nphdata, skin) in zip(entries, extras)
+        ]
+        outputs = await render_dynamic_batch(renderers, "pacestats")
+        return [output for output in outputs if output]
+
+    async def send_daily_leaderboard(self, message_target, group_id=None, prepared=None):
+        if prepared is None:
+            prepared = await self.prepare_daily_leaderboard({"group_id": group_id})
+        render_output, text, card_outputs = prepared
+        try:
+            if render_output:
+                chain = MessageChain().file_image(render_output)
+            else:
+                chain = MessageChain().message(text)
+            for card_output in card_outputs:
+                chain.file_image(card_output)
+            await self.context.send_message(message_target, chain)
+        finally:
+            remove_render_output(render_output)
+            for card_output in card_outputs:
+                remove_render_output(card_output)
 
     #查询Ranked个人数据
     @filter.command("rank")
@@ -196,42 +542,41 @@ class PaceManPlugin(Star):
         try:
             if name is None:
                 userid = event.get_sender_id()
-                if userid not in self.player_data.keys():
+                username = self.players.get_username(userid)
+                if username is None:
                     yield event.plain_result("请先使用 '/register 用户名' 命令注册")
                     return
-                username = self.player_data[userid]['username']
             else:
                 username = name
-            data = await fetch_api_data("ranked", "user_stats", username)
-            if data['status']=='success':
-                user=data['data']['nickname']
-                elorate=data['data']['eloRate']
-                elorank=data['data']['eloRank']
-                personalbest=data['data']['statistics']['season']['bestTime']['ranked']
-                forfeits=data['data']['statistics']['season']['forfeits']['ranked']
-                playedMatches=data['data']['statistics']['season']['playedMatches']['ranked']
-                completions=data['data']['statistics']['season']['completions']['ranked']
-                completionTime=data['data']['statistics']['season']['completionTime']['ranked']
-                wins=data['data']['statistics']['season']['wins']['ranked']
-                if personalbest is None:
-                    yield event.plain_result(f"{username}本赛季未参加ranked。")
-                else:
-                    forfeits_rate=forfeits/playedMatches
-                    avg_completion_time=completionTime/completions
-                    win_rate=wins/playedMatches
-                    pb_m,pb_s=get_time(personalbest)
-                    avg_m,avg_s=get_time(avg_completion_time)
-
-                    result = (f"{user}:\n"
-                        f"当前elo:{elorate}\n"
-                        f"当前elo排名:{elorank}\n"
-                        f"赛季PB:{pb_m}分{pb_s}秒\n"
-                        f"赛季胜率:{win_rate*100:.2f}%\n"
-                        f"赛季弃权率:{forfeits_rate*100:.2f}%\n"
-                        f"赛季平均完成时间:{avg_m}分{avg_s}秒")
-                    yield event.plain_result(result)
-            else:
+            data = await fetch_api_data("ranked", "user_stats", username, client=self.http_client)
+            user = parse_ranked_user(data)
+            if user is None:
                 yield event.plain_result("没有找到该用户。")
+            elif user.best_time is None:
+                yield event.plain_result(f"{username}本赛季未参加ranked。")
+            else:
+                result = ranked_text(user)
+                # 比赛记录只做增量同步，失败时使用已有的本地记录
+                await fetch_optional(
+                    sync_matches(self.matches, user.uuid, self.http_client),
+                    RANKED_MATCHES_TIMEOUT, 0, "同步Ranked比赛记录",
+                )
+                render_data = rank_render_data(
+                    user.nickname, ranked_summary(user),
+                    self.matches.recent(user.uuid, RANKED_CHART_MATCHES),
+                )
+                render_output = None
+                try:
+                    render_output = await render_rank(self, render_data)
+                    if render_output:
+                        yield event.chain_result([Comp.Image.fromFileSystem(render_output)])
+                    else:
+                        yield event.plain_result(result)
+                except Exception as e:
+                    logger.exception("Generate image error:")
+                    yield event.plain_result(result)
+                finally:
+                    remove_render_output(render_output)
         except httpx.HTTPStatusError as e:
             yield event.plain_result(f"没有找到该用户")
         except httpx.TimeoutException:
@@ -242,4 +587,15 @@ class PaceManPlugin(Star):
             yield event.plain_result(f"解析JSON时发生错误: {e}")
         except Exception as e:
             yield event.plain_result(f"发生未知错误: {e}")
-    
+
+    async def terminate(self):
+        # 插件卸载时关闭连接池、PIL 渲染线程池和数据库
+        await self.http_client.aclose()
+        shutdown_fallback_executor()
+        self.scheduler.close()
+        self.scheduler.store.close()
+        self.watcher.close()
+        self.watcher.store.close()
+        self.players.close()
+        self.runs.close()
+        self.matches.close()
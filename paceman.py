@@ -1,6 +1,10 @@
 import base64
+import hashlib
+import json
+import random
+import re
 from pydantic import BaseModel
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
 from astrbot.api import logger
 from astrbot.api.all import Star
 import httpx
@@ -8,10 +12,24 @@ from .constant import *
 import os
 import asyncio
 import shutil
+from concurrent.futures import ThreadPoolExecutor
+import uuid
+from types import MappingProxyType
+from typing import Mapping, NamedTuple
 try:
     from .utils import get_time, to_local_time
+    from .cache import CardCache, SkinCache
+    from .limiter import CircuitBreaker, upstream
 except ImportError:
     from utils import get_time, to_local_time
+    from cache import CardCache, SkinCache
+    from limiter import CircuitBreaker, upstream
+
+card_cache = CardCache(CARD_CACHE_DIR, RECENT_DYNAMIC_CACHE, CARD_CACHE_MAX_BYTES)
+render_breaker = CircuitBreaker(RENDER_BREAKER_THRESHOLD, RENDER_BREAKER_RESET)
+# fast 渲染模式下不调用 html_render，由插件配置设置
+html_render_enabled = True
+skin_cache = SkinCache(SKIN_CACHE_DIR, SKIN_CACHE_TTL, SKIN_NEGATIVE_TTL, SKIN_CACHE_MAX_BYTES)
 
 class StructureStats(BaseModel):
     count: int
@@ -45,174 +63,79 @@ class RunStats(BaseModel):
     updatedTime:int
     realUpdated:int
 
-class Paceman:
-    imgpath = os.path.join(os.path.dirname(__file__), "public")
-    # 背景图片
-    smallfont = ImageFont.truetype(f"{imgpath}/1_Minecraft-Regular.otf", 24)
-    bigfont = ImageFont.truetype(f"{imgpath}/1_Minecraft-Regular.otf", 40)
-
-    def __init__(self,uname: str, data:UserSessionStats):
-        self._uname = uname
-        self.data = data
-        self.background = Image.open(f"{Paceman.imgpath}/background.webp").convert("RGBA")
-        self.icons = {
-            "nether": Image.open(f"{Paceman.imgpath}/nether.webp").convert("RGBA"),
-            "bastion": Image.open(f"{Paceman.imgpath}/bastion.webp").convert("RGBA"),
-            "fortress": Image.open(f"{Paceman.imgpath}/fortress.webp").convert("RGBA"),
-            "first_portal": Image.open(f"{Paceman.imgpath}/first_portal.webp").convert("RGBA"),
-            "stronghold": Image.open(f"{Paceman.imgpath}/stronghold.webp").convert("RGBA"),
-            "end": Image.open(f"{Paceman.imgpath}/end.webp").convert("RGBA"),
-            "finish": Image.open(f"{Paceman.imgpath}/finish.webp").convert("RGBA"),
-        }
-        self.stats = {
-            "netherstats": f'{self.data.nether.count} {self.data.nether.avg}',
-            "bastionstats": f'{self.data.first_structure.count} {self.data.first_structure.avg}',
-            "fortressstats": f'{self.data.second_structure.count} {self.data.second_structure.avg}',
-            "first_portalstats": f'{self.data.first_portal.count} {self.data.first_portal.avg}',
-            "strongholdstats": f'{self.data.stronghold.count} {self.data.stronghold.avg}',
-            "endstats": f'{self.data.end.count} {self.data.end.avg}',
-            "finishstats": f'{self.data.finish.count} {self.data.finish.avg}'
-        }
-
-    def generate_background_image(self):
-        for index, key in enumerate(self.icons):
-            pic = self.icons[key].resize((40, 40))
-            position = (20, index * 46 + 20)
-            self.background.paste(pic, position, mask=pic)
-
-    def generate_skin(self):
-        url = f"https://render.crafty.gg/3d/full/{self._uname}"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
-        }
-        try:
-            with httpx.Client() as client:
-                response = client.get(url, headers=headers, timeout=20.0)
-                if response.status_code == 200:
-                    with open(f"{Paceman.imgpath}/{self._uname}.webp", "wb") as f:
-                        f.write(response.content)
-        except Exception as e:
-            logger.info(f"获取皮肤失败: {e}")
-
-        try:
-            image = Image.open(f"{Paceman.imgpath}/{self._uname}.webp").convert("RGBA")
-            image = image.resize((158, 256))
-            position = (350, 70)
-            self.background.paste(image, position, mask=image)
-        except Exception as e:
-            logger.info(f"皮肤文件不存在: {e}")
-
-    def generate_stats(self):
-        # 绘制玩家昵称
-        draw = ImageDraw.Draw(self.background)
-        text_width = draw.textlength(self._uname, font=Paceman.smallfont)
-        x = 430 - text_width / 2
-        draw.text((x, 30), self._uname, fill="white", font=Paceman.smallfont)
-        # 绘制数据
-        for index, key in enumerate(self.stats):
-            text_position = (100, index * 46 + 20)
-            draw.text(text_position, self.stats[key], fill="white", font=Paceman.bigfont)
-        # 确保 result 目录存在
-        result_dir = os.path.join(os.path.dirname(__file__), "result")
-        os.makedirs(result_dir, exist_ok=True)
-        self.background.save(os.path.join(result_dir, "output.png"))
-        # Paceman.background.save("./result/output.png")
-
-    def generate_image(self):
-        logger.info("Generating image...")
-
-        self.generate_background_image()
-        self.generate_skin()
-        self.generate_stats()
-
-        logger.info("Image generated successfully.")
-
-class Run:
-    imgpath = os.path.join(os.path.dirname(__file__), "public")
-    smallfont = ImageFont.truetype(f"{imgpath}/1_Minecraft-Regular.otf", 24)
-    bigfont = ImageFont.truetype(f"{imgpath}/1_Minecraft-Regular.otf", 40)
-
-    def __init__(self, run:RunStats, uname:str):
-        self._uname = uname
-        self.run = run
-        self.background = Image.open(f"{Paceman.imgpath}/background.webp").convert("RGBA")
-        self.icons = {
-            "nether": Image.open(f"{Paceman.imgpath}/nether.webp").convert("RGBA"),
-            "bastion": Image.open(f"{Paceman.imgpath}/bastion.webp").convert("RGBA"),
-            "fortress": Image.open(f"{Paceman.imgpath}/fortress.webp").convert("RGBA"),
-            "first_portal": Image.open(f"{Paceman.imgpath}/first_portal.webp").convert("RGBA"),
-            "stronghold": Image.open(f"{Paceman.imgpath}/stronghold.webp").convert("RGBA"),
-            "end": Image.open(f"{Paceman.imgpath}/end.webp").convert("RGBA"),
-            "finish": Image.open(f"{Paceman.imgpath}/finish.webp").convert("RGBA"),
-        }
-        self.stats = {
-            "netherstats": f'{get_time(self.run.nether)[0]}:{get_time(self.run.nether)[1]:02d}',
-            "bastionstats": f'{get_time(self.run.bastion)[0]}:{get_time(self.run.bastion)[1]:02d}',
-            "fortressstats": f'{get_time(self.run.fortress)[0]}:{get_time(self.run.fortress)[1]:02d}',
-            "first_portalstats": f'{get_time(self.run.first_portal)[0]}:{get_time(self.run.first_portal)[1]:02d}',
-            "strongholdstats": f'{get_time(self.run.stronghold)[0]}:{get_time(self.run.stronghold)[1]:02d}',
-            "endstats": f'{get_time(self.run.end)[0]}:{get_time(self.run.end)[1]:02d}',
-            "finishstats": f'{get_time(self.run.finish)[0]}:{get_time(self.run.finish)[1]:02d}',
-        }
-
-    def generate_background_image(self):
-        for index, key in enumerate(self.icons):
-            pic = self.icons[key].resize((40, 40))
-            position = (20, index * 46 + 20)
-            self.background.paste(pic, position, mask=pic)
-
-    def generate_skin(self):
-        url = f"https://render.crafty.gg/3d/full/{self._uname}"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
-        }
-        try:
-            with httpx.Client() as client:
-                response = client.get(url, headers=headers, timeout=20.0)
-                if response.status_code == 200:
-                    with open(f"{Run.imgpath}/{self._uname}.webp", "wb") as f:
-                        f.write(response.content)
-        except Exception as e:
-            logger.info(f"获取皮肤失败: {e}")
-
-        try:
-            image = Image.open(f"{Run.imgpath}/{self._uname}.webp").convert("RGBA")
-            image = image.resize((158, 256))
-            position = (350, 70)
-            self.background.paste(image, position, mask=image)
-        except Exception as e:
-            logger.info(f"皮肤文件不存在: {e}")
-        
-    def generate_stats(self):
-        draw = ImageDraw.Draw(self.background)
-        text_width = draw.textlength(self._uname, font=Run.smallfont)
-        x = 430 - text_width / 2
-        draw.text((x, 30), self._uname, fill="white", font=Run.smallfont)
-        # 绘制数据
-        for index, key in enumerate(self.stats):
-            text_position = (100, index * 46 + 20)
-            draw.text(text_position, self.stats[key], fill="white", font=Paceman.bigfont)
-        # 绘制时间,在底部居中位置
-        text_position = (290 - draw.textlength(to_local_time(self.run.updatedTime), font=Run.smallfont) / 2, 330)
-        draw.text(text_position, to_local_time(self.run.updatedTime), fill="white", font=Paceman.smallfont)
-        # 确保 result 目录存在
-        result_dir = os.path.join(os.path.dirname(__file__), "result")
-        os.makedirs(result_dir, exist_ok=True)
-        self.background.save(os.path.join(result_dir, "output.png"))
-
-    def generate_image(self):
-        logger.info("Generating image...")
-
-        self.generate_background_image()
-        self.generate_skin()
-        self.generate_stats()
-
-        logger.info("Image generated successfully.")
+_fallback_executor = ThreadPoolExecutor(
+    max_workers=FALLBACK_WORKERS, thread_name_prefix="pacemanbot-pil"
+)
+# 正在执行和排队的 PIL 渲染总数上限
+_fallback_slots = asyncio.Semaphore(FALLBACK_WORKERS + FALLBACK_QUEUE_SIZE)
+
+async def render_fallback(render, *args):
+    """
+    在线程池中执行 PIL 渲染函数，避免阻塞事件循环。
+    队列已满时直接抛出异常，由调用方回退到文字结果。
+    """
+    if _fallback_slots.locked():
+        raise RuntimeError("PIL 渲染队列已满")
+    async with _fallback_slots:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_fallback_executor, render, *args)
+
+def set_render_mode(mode: str):
+    global html_render_enabled
+    html_render_enabled = mode != RENDER_MODE_FAST
+
+def shutdown_fallback_executor():
+    _fallback_executor.shutdown(wait=False, cancel_futures=True)
+
+_template_cache: dict[str, tuple[int, str]] = {}
+_inlined_template_cache: dict[str, tuple[tuple, str]] = {}
+
+# 模板中引用静态资源的占位符，例如 {{ icons.nether | safe }}
+ASSET_PLACEHOLDER_RE = re.compile(
+    r"\{\{\s*(font_uri|background_uri|icons\.(\w+))\s*\|\s*safe\s*\}\}"
+)
 
 def load_template(template_name: str) -> str:
+    """
+    读取模板源码，按文件修改时间缓存。
+    """
     template_path = get_template_path(template_name)
+    mtime = os.stat(template_path).st_mtime_ns
+    cached = _template_cache.get(template_path)
+    if cached and cached[0] == mtime:
+        return cached[1]
     with open(template_path, "r", encoding="utf-8") as f:
-        return f.read()
+        tmpl = f.read()
+    _template_cache[template_path] = (mtime, tmpl)
+    return tmpl
+
+def minify_template(tmpl: str) -> str:
+    # 去掉注释、缩进和空行；行尾换行保留，不改变 HTML 的空白语义
+    tmpl = re.sub(r"<!--.*?-->", "", tmpl, flags=re.S)
+    tmpl = re.sub(r"\n\s+", "\n", tmpl)
+    return tmpl.strip()
+
+def load_inlined_template(template_name: str) -> str:
+    """
+    返回已内联静态资源并压缩过的模板。
+    使用该模板时渲染数据中不需要再携带字体、背景和图标。
+    """
+    template_path = get_template_path(template_name)
+    bundle = asset_bundle()
+    version = (os.stat(template_path).st_mtime_ns, bundle.mtimes)
+    cached = _inlined_template_cache.get(template_path)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    def replace_asset(match: re.Match) -> str:
+        name, icon = match.group(1), match.group(2)
+        if icon is not None:
+            return bundle.icons.get(icon, match.group(0))
+        return getattr(bundle, name)
+
+    tmpl = ASSET_PLACEHOLDER_RE.sub(replace_asset, minify_template(load_template(template_name)))
+    _inlined_template_cache[template_path] = (version, tmpl)
+    return tmpl
 
 def asset_data_uri(filename: str, mime_type: str) -> str:
     asset_path = os.path.join(ASSETS_DIR, filename)
@@ -233,18 +156,20 @@ def bytes_data_uri(content: bytes, mime_type: str) -> str:
     encoded = base64.b64encode(content).decode("ascii")
     return f"data:{mime_type};base64,{encoded}"
 
-async def fetch_skin_data_uri(uname: str) -> str:
-    skin_path = os.path.join(ASSETS_DIR, f"{uname}.webp")
-    if os.path.exists(skin_path):
-        with open(skin_path, "rb") as f:
-            cached_content = f.read()
-        cached_mime_type = image_mime_type(cached_content)
-        if cached_mime_type:
-            return bytes_data_uri(cached_content, cached_mime_type)
-        try:
-            os.remove(skin_path)
-        except OSError as e:
-            logger.info(f"删除无效皮肤缓存失败: {e}")
+async def fetch_skin_bytes(
+    uname: str,
+    client: httpx.AsyncClient | None = None,
+    timeout: float = 20.0,
+) -> bytes | None:
+    """
+    获取玩家皮肤渲染图的原始字节，失败时返回 None。
+    未过期的缓存直接返回；过期后用条件请求校验，上游出错时继续使用旧皮肤。
+    """
+    cached_content, meta = skin_cache.get(uname)
+    if cached_content is not None and skin_cache.is_fresh(meta):
+        return cached_content
+    if skin_cache.is_negative(uname):
+        return cached_content
 
     url = f"https://render.crafty.gg/3d/full/{uname}"
     headers = {
@@ -253,29 +178,72 @@ async def fetch_skin_data_uri(uname: str) -> str:
             "AppleWebKit/537.36 (KHTML, like Gecko) "
             "Chrome/58.0.3029.110 Safari/537.3"
         )
-    }
+    } | skin_cache.conditional_headers(meta)
     try:
-        async with httpx.AsyncClient(timeout=20.0) as client:
-            response = await client.get(url, headers=headers)
-            response.raise_for_status()
-            mime_type = image_mime_type(response.content)
-            if not mime_type:
-                logger.info("获取皮肤失败: 响应不是有效图片")
-                return ""
-            with open(skin_path, "wb") as f:
-                f.write(response.content)
-            return bytes_data_uri(response.content, mime_type)
+        async with upstream("crafty"):
+            if client is None:
+                async with httpx.AsyncClient(timeout=timeout) as temp_client:
+                    response = await temp_client.get(url, headers=headers)
+            else:
+                response = await client.get(url, headers=headers, timeout=timeout)
+        if response.status_code == 304 and cached_content is not None:
+            skin_cache.refresh(uname)
+            return cached_content
+        if response.status_code == 404:
+            skin_cache.mark_negative(uname)
+            return None
+        response.raise_for_status()
+        if not image_mime_type(response.content):
+            logger.info("获取皮肤失败: 响应不是有效图片")
+            skin_cache.mark_negative(uname)
+            return cached_content
+        skin_cache.put(
+            uname,
+            response.content,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+        return response.content
+    except httpx.TimeoutException as e:
+        logger.info(f"获取皮肤超时: {e}")
+        skin_cache.mark_negative(uname, SKIN_TIMEOUT_NEGATIVE_TTL)
     except Exception as e:
         logger.info(f"获取皮肤失败: {e}")
-        return ""
+        skin_cache.mark_negative(uname, SKIN_TIMEOUT_NEGATIVE_TTL)
+    return cached_content
+
+def skin_data_uri(skin: bytes | None) -> str:
+    mime_type = image_mime_type(skin) if skin else None
+    return bytes_data_uri(skin, mime_type) if mime_type else ""
+
+async def fetch_skin_data_uri(
+    uname: str,
+    client: httpx.AsyncClient | None = None,
+    timeout: float = 20.0,
+) -> str:
+    return skin_data_uri(await fetch_skin_bytes(uname, client, timeout))
 
 def result_image_path() -> str:
-    result_dir = os.path.join(os.path.dirname(__file__), "result")
-    os.makedirs(result_dir, exist_ok=True)
-    return os.path.join(result_dir, "output.png")
+    """
+    为每次请求生成独立的输出文件路径，避免并发请求互相覆盖图片。
+    发送完成后由调用方通过 remove_render_output 清理。
+    """
+    os.makedirs(RESULT_DIR, exist_ok=True)
+    return os.path.join(RESULT_DIR, f"output-{uuid.uuid4().hex}.png")
+
+def remove_render_output(render_output: str | None):
+    # 只清理 result 目录下的单次输出文件，不会误删缓存
+    if not render_output:
+        return
+    if os.path.dirname(os.path.abspath(render_output)) != os.path.abspath(RESULT_DIR):
+        return
+    try:
+        os.remove(render_output)
+    except OSError as e:
+        logger.info(f"清理渲染结果失败: {e}")
 
-def copy_render_output(render_output: str) -> str:
-    output_path = result_image_path()
+def copy_render_output(render_output: str, output_path: str | None = None) -> str:
+    output_path = output_path or result_image_path()
     if os.path.abspath(render_output) == os.path.abspath(output_path):
         with open(output_path, "rb") as f:
             if not image_mime_type(f.read(16)):
@@ -293,23 +261,294 @@ def copy_render_output(render_output: str) -> str:
         shutil.copyfile(render_output, output_path)
     return output_path
 
-def common_template_data(uname: str) -> dict:
+def card_cache_key(template_name: str, tmpl: str, render_data: dict) -> str:
+    """
+    根据模板内容和渲染数据计算卡片缓存 key，数据不变时得到相同的图片。
+    """
+    digest = hashlib.sha256()
+    digest.update(template_name.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(tmpl.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(
+        json.dumps(
+            render_data, sort_keys=True, ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
+    )
+    return digest.hexdigest()
+
+async def render_template_card(star: Star, template_name: str, render_data: dict) -> str | None:
+    """
+    使用 html_render 渲染卡片，内容相同的卡片直接返回缓存的图片。
+    渲染失败时返回 None，由调用方回退到 PIL 渲染。
+    """
+    options = {"full_page": False, "type": "png", "scale": "device"}
+    # 静态资源已内联进模板，render_data 只需要携带动态字段
+    tmpl = load_inlined_template(template_name)
+
+    cache_key = card_cache_key(template_name, tmpl, render_data)
+    cached_output = card_cache.get(cache_key)
+    if cached_output:
+        # 复制一份给本次请求，发送后清理时不影响缓存
+        output_path = result_image_path()
+        shutil.copyfile(cached_output, output_path)
+        return output_path
+
+    render_output = await render_html(star, tmpl, render_data, options)
+    if render_output is None:
+        return None
+    output_path = copy_render_output(render_output)
+    try:
+        card_cache.put(cache_key, output_path)
+    except OSError as e:
+        logger.info(f"写入卡片缓存失败: {e}")
+    return output_path
+
+async def render_html(star: Star, tmpl: str, render_data: dict, options: dict) -> str | None:
+    """
+    调用 html_render，带熔断、重试和总时限，返回渲染服务生成的图片路径。
+    """
+    if not html_render_enabled:
+        return None
+    if not render_breaker.allow():
+        logger.info("渲染服务熔断中，跳过 html_render")
+        return None
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + RENDER_DEADLINE
+    limiter = upstream("renderer")
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        # 排队等待渲染槽位的时间也计入总时限
+        try:
+            await asyncio.wait_for(limiter.__aenter__(), deadline - loop.time())
+        except asyncio.TimeoutError:
+            logger.error(f"等待渲染队列超时 (尝试次数: {attempt})")
+            return None
+        try:
+            # 排队期间熔断器可能已经打开，时限也可能已经用完
+            remaining = deadline - loop.time()
+            if render_breaker.is_open or remaining <= 0:
+                logger.info("渲染服务熔断中或已超过总时限，跳过 html_render")
+                return None
+            render_output = await asyncio.wait_for(
+                star.html_render(
+                    tmpl=tmpl,
+                    data=render_data,
+                    return_url=False,
+                    options=options,
+                ),
+                remaining,
+            )
+            if (
+                render_output
+                and os.path.exists(render_output)
+                and os.path.getsize(render_output) > 4096
+            ):
+                render_breaker.record_success()
+                return render_output
+            logger.error(f"渲染图片失败 (尝试次数: {attempt}): 渲染结果无效")
+        except asyncio.TimeoutError:
+            logger.error(f"渲染图片超时 (尝试次数: {attempt})")
+        except Exception as e:
+            logger.error(f"渲染图片失败 (尝试次数: {attempt}): {e}")
+        finally:
+            await limiter.__aexit__(None, None, None)
+
+        render_breaker.record_failure()
+        if attempt == MAX_ATTEMPTS or not render_breaker.allow():
+            break
+        # 指数退避加随机抖动，超过总时限就不再重试
+        delay = min(RETRY_MAX_DELAY, RETRY_DELAY * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+        if loop.time() + delay >= deadline:
+            break
+        await asyncio.sleep(delay)
+    return None
+
+BODY_RE = re.compile(r"<body>(.*)</body>", re.S)
+TITLE_RE = re.compile(r"<title>.*?</title>", re.S)
+TEMPLATE_SYNTAX_RE = re.compile(r"\{\{|\{%")
+BATCH_STYLE = "<style>body{height:auto !important;overflow:visible !important;}</style>"
+
+def batch_template(tmpl: str, keys: list[str]) -> str:
+    """
+    把单卡片模板改写成在一个页面里纵向排列多张卡片的模板，
+    每张卡片的字段通过 with 绑定回原来的变量名，卡片模板本身不需要修改。
+    <body> 之外的部分所有卡片共用，标题中的变量会被去掉；
+    其余位置引用了卡片数据的模板不能批量渲染，抛出 ValueError。
+    """
+    match = BODY_RE.search(tmpl)
+    if match is None:
+        raise ValueError("模板中没有 <body>")
+    head = TITLE_RE.sub("<title></title>", tmpl[:match.start()])
+    tail = tmpl[match.end():]
+    if TEMPLATE_SYNTAX_RE.search(head) or TEMPLATE_SYNTAX_RE.search(tail):
+        raise ValueError("模板在 <body> 之外引用了卡片数据，不能批量渲染")
+    bindings = ", ".join(f"{key}=card[{key!r}]" for key in keys)
+    return (
+        head.replace("</head>", f"{BATCH_STYLE}</head>")
+        + "<body>{% for card in cards %}{% with " + bindings + " %}"
+        + match.group(1)
+        + "{% endwith %}{% endfor %}</body>"
+        + tail
+    )
+
+def split_batch_output(render_output: str, count: int) -> list[str]:
+    """
+    按卡片尺寸裁剪整页截图。缩放比例由截图宽度得出，
+    截图高度与张数不符时说明排版出了问题，抛出 ValueError，不保存任何一张。
+    解码和编码整页图片很慢，需要在线程池中调用。
+    """
+    output_paths = []
+    with Image.open(render_output) as image:
+        scale = image.width / CARD_SIZE[0]
+        height = round(CARD_SIZE[1] * scale)
+        if image.height != height * count:
+            raise ValueError(
+                f"批量截图尺寸 {image.width}x{image.height} 与 {count} 张卡片不符"
+            )
+        image = image.convert("RGBA")
+        for index in range(count):
+            output_path = result_image_path()
+            image.crop((0, index * height, image.width, (index + 1) * height)).save(
+                output_path, format="PNG"
+            )
+            output_paths.append(output_path)
+    return output_paths
+
+async def render_template_cards(
+    star: Star,
+    template_name: str,
+    render_data_list: list[dict],
+) -> list[str | None]:
+    """
+    批量渲染同一模板的多张卡片：缓存命中的直接复制，其余在一个页面中一次渲染后裁剪。
+    返回与 render_data_list 一一对应的图片路径，渲染失败的位置为 None。
+    """
+    tmpl = load_inlined_template(template_name)
+    outputs: list[str | None] = [None] * len(render_data_list)
+    pending = []
+    for index, render_data in enumerate(render_data_list):
+        cache_key = card_cache_key(template_name, tmpl, render_data)
+        cached_output = card_cache.get(cache_key)
+        if cached_output:
+            outputs[index] = result_image_path()
+            shutil.copyfile(cached_output, outputs[index])
+        else:
+            pending.append((index, cache_key, render_data))
+
+    options = {"full_page": True, "type": "png", "scale": "device"}
+    for start in range(0, len(pending), BATCH_RENDER_MAX_CARDS):
+        chunk = pending[start:start + BATCH_RENDER_MAX_CARDS]
+        keys = sorted({key for _, _, render_data in chunk for key in render_data})
+        try:
+            batch_tmpl = batch_template(tmpl, keys)
+        except ValueError as e:
+            logger.error(f"无法批量渲染模板 {template_name}: {e}")
+            break
+        render_output = await render_html(
+            star,
+            batch_tmpl,
+            {"cards": [render_data for _, _, render_data in chunk]},
+            options,
+        )
+        if render_output is None:
+            continue
+        try:
+            output_paths = await render_fallback(split_batch_output, render_output, len(chunk))
+        except Exception as e:
+            logger.error(f"裁剪批量渲染结果失败: {e}")
+            continue
+        for (index, cache_key, _), output_path in zip(chunk, output_paths):
+            outputs[index] = output_path
+            try:
+                card_cache.put(cache_key, output_path)
+            except OSError as e:
+                logger.info(f"写入卡片缓存失败: {e}")
+    return outputs
+
+class AssetBundle(NamedTuple):
+    font_uri: str
+    background_uri: str
+    icons: Mapping[str, str]
+    mtimes: tuple
+
+_asset_bundle: AssetBundle | None = None
+
+def _asset_mtimes() -> tuple:
+    return tuple(
+        os.stat(os.path.join(ASSETS_DIR, filename)).st_mtime_ns
+        for filename in TEMPLATE_ASSETS
+    )
+
+def asset_bundle() -> AssetBundle:
+    """
+    返回模板用到的字体、背景和图标的 data URI。
+    只在首次调用或资源文件修改时间变化时重新读取并编码。
+    """
+    global _asset_bundle
+    mtimes = _asset_mtimes()
+    if _asset_bundle is None or _asset_bundle.mtimes != mtimes:
+        uris = {
+            filename: asset_data_uri(filename, mime_type)
+            for filename, mime_type in TEMPLATE_ASSETS.items()
+        }
+        _asset_bundle = AssetBundle(
+            font_uri=uris[FONT_FILE],
+            background_uri=uris[BACKGROUND_FILE],
+            icons=MappingProxyType({
+                key: uris[f"{key}.webp"] for key in SPLIT_ICONS
+            }),
+            mtimes=mtimes,
+        )
+    return _asset_bundle
+
+def common_template_data(uname: str, include_assets: bool = True) -> dict:
+    data = {"uname": uname, "skin_uri": ""}
+    if include_assets:
+        bundle = asset_bundle()
+        data |= {
+            "font_uri": bundle.font_uri,
+            "background_uri": bundle.background_uri,
+            "icons": dict(bundle.icons),
+        }
+    return data
+
+def session_render_data(data: UserSessionStats, nph_stats: dict | None = None) -> dict:
+    """
+    pacestats 模板使用的各阶段数据和 NPH 概览，/compare 也复用这份数据。
+    """
+    nph_stats = nph_stats or {}
     return {
-        "uname": uname,
-        "font_uri": asset_data_uri("1_Minecraft-Regular.otf", "font/otf"),
-        "background_uri": asset_data_uri("background.webp", "image/webp"),
-        "skin_uri": "",
-        "icons": {
-            "nether": asset_data_uri("nether.webp", "image/webp"),
-            "bastion": asset_data_uri("bastion.webp", "image/webp"),
-            "fortress": asset_data_uri("fortress.webp", "image/webp"),
-            "first_portal": asset_data_uri("first_portal.webp", "image/webp"),
-            "stronghold": asset_data_uri("stronghold.webp", "image/webp"),
-            "end": asset_data_uri("end.webp", "image/webp"),
-            "finish": asset_data_uri("finish.webp", "image/webp"),
+        "stats": {
+            "nether": {"count": data.nether.count, "avg": data.nether.avg},
+            "bastion": {"count": data.first_structure.count, "avg": data.first_structure.avg},
+            "fortress": {"count": data.second_structure.count, "avg": data.second_structure.avg},
+            "first_portal": {"count": data.first_portal.count, "avg": data.first_portal.avg},
+            "stronghold": {"count": data.stronghold.count, "avg": data.stronghold.avg},
+            "end": {"count": data.end.count, "avg": data.end.avg},
+            "finish": {"count": data.finish.count, "avg": data.finish.avg},
+        },
+        "summary": {
+            "rnph": nph_stats.get("rnph", 0),
+            "rpe": nph_stats.get("rpe", 0),
+            "resets": nph_stats.get("resets", 0),
+            "total_resets": nph_stats.get("totalResets", 0),
         },
     }
 
+def run_render_data(run: RunStats) -> dict:
+    """
+    run 模板使用的各阶段时间和更新时间。
+    """
+    def format_time(milliseconds: int) -> str:
+        minutes, seconds = get_time(milliseconds)
+        return f"{minutes}:{seconds:02d}"
+
+    return {
+        "times": {split: format_time(getattr(run, split)) for split in SPLIT_ICONS},
+        "update_time": to_local_time(run.updatedTime),
+    }
+
 class Renderer:
     def __init__(
         self,
@@ -317,125 +556,71 @@ class Renderer:
         uname: str,
         data: UserSessionStats,
         nph_stats: dict | None = None,
+        skin_uri: str | None = None,
     ):
         self._uname = uname
         self.data = data
         self.star = star_instance
         self.nph_stats = nph_stats or {}
+        # 调用方已经并发获取过皮肤时直接复用，None 表示由渲染器自行获取
+        self.skin_uri = skin_uri
 
-        self.render_data = common_template_data(self._uname) | {
-            "stats": {
-                "nether": {
-                    "count": self.data.nether.count,
-                    "avg": self.data.nether.avg
-                },
-                "bastion": {
-                    "count": self.data.first_structure.count,
-                    "avg": self.data.first_structure.avg
-                },
-                "fortress": {
-                    "count": self.data.second_structure.count,
-                    "avg": self.data.second_structure.avg
-                },
-                "first_portal": {
-                    "count": self.data.first_portal.count,
-                    "avg": self.data.first_portal.avg
-                },
-                "stronghold": {
-                    "count": self.data.stronghold.count,
-                    "avg": self.data.stronghold.avg
-                },
-                "end": {
-                    "count": self.data.end.count,
-                    "avg": self.data.end.avg
-                },
-                "finish": {
-                    "count": self.data.finish.count,
-                    "avg": self.data.finish.avg
-                }
-            },
-            "summary": {
-                "rnph": self.nph_stats.get("rnph", 0),
-                "rpe": self.nph_stats.get("rpe", 0),
-                "resets": self.nph_stats.get("resets", 0),
-                "total_resets": self.nph_stats.get("totalResets", 0),
-            },
-        }
+        self.render_data = common_template_data(self._uname, include_assets=False) | (
+            session_render_data(self.data, self.nph_stats)
+        )
 
     async def render_dynamic(self, template_name: str = DEFAULT_TEMPLATE):
         """
         将渲染数据字典渲染成最终图片。
         这是该类的主要入口方法。
         """
-        options = {"full_page": False, "type": "png", "scale": "device"}
-
-        tmpl = load_template(template_name)
-        self.render_data["skin_uri"] = await fetch_skin_data_uri(self._uname)
-
-        for attempt in range(1, MAX_ATTEMPTS + 1):
-            render_output = None
-            try:
-                render_output = await self.star.html_render(
-                    tmpl=tmpl,
-                    data=self.render_data,
-                    return_url=False,
-                    options=options,
-                )
-                if (
-                    render_output
-                    and os.path.exists(render_output)
-                    and os.path.getsize(render_output) > 4096
-                ):
-                    return copy_render_output(render_output)
-            except Exception as e:
-                logger.error(f"渲染图片失败 (尝试次数: {attempt}): {e}")
-
-            if attempt < MAX_ATTEMPTS:
-                await asyncio.sleep(RETRY_DELAY)
+        if self.skin_uri is None:
+            self.skin_uri = await fetch_skin_data_uri(
+                self._uname, getattr(self.star, "http_client", None)
+            )
+        self.render_data["skin_uri"] = self.skin_uri
+        return await render_template_card(self.star, template_name, self.render_data)
 
 class RunRenderer:
-    def __init__(self, star_instance: Star, uname: str, run_stats: RunStats):
+    def __init__(
+        self,
+        star_instance: Star,
+        uname: str,
+        run_stats: RunStats,
+        skin_uri: str | None = None,
+    ):
         self._uname = uname
         self.run = run_stats
         self.star = star_instance
-        self.render_data = common_template_data(self._uname) | {
-            "times": {
-                "nether": self._format_time(self.run.nether),
-                "bastion": self._format_time(self.run.bastion),
-                "fortress": self._format_time(self.run.fortress),
-                "first_portal": self._format_time(self.run.first_portal),
-                "stronghold": self._format_time(self.run.stronghold),
-                "end": self._format_time(self.run.end),
-                "finish": self._format_time(self.run.finish),
-            },
-            "update_time": to_local_time(self.run.updatedTime),
-        }
-
-    def _format_time(self, milliseconds: int) -> str:
-        minutes, seconds = get_time(milliseconds)
-        return f"{minutes}:{seconds:02d}"
+        self.skin_uri = skin_uri
+        self.render_data = common_template_data(self._uname, include_assets=False) | (
+            run_render_data(self.run)
+        )
 
     async def render_dynamic(self, template_name: str = "run"):
-        options = {"full_page": False, "type": "png", "scale": "device"}
-        tmpl = load_template(template_name)
-        self.render_data["skin_uri"] = await fetch_skin_data_uri(self._uname)
-
-        for attempt in range(1, MAX_ATTEMPTS + 1):
-            try:
-                render_output = await self.star.html_render(
-                    tmpl=tmpl,
-                    data=self.render_data,
-                    return_url=False,
-                    options=options,
-                )
-                if (
-                    render_output
-                    and os.path.exists(render_output)
-                    and os.path.getsize(render_output) > 4096
-                ):
-                    return copy_render_output(render_output)
-            except Exception as e:
-                logger.error(f"渲染图片失败 (尝试次数: {attempt}): {e}")
-
-            if attempt < MAX_ATTEMPTS:
-                await asyncio.sleep(RETRY_DELAY)
+        if self.skin_uri is None:
+            self.skin_uri = await fetch_skin_data_uri(
+                self._uname, getattr(self.star, "http_client", None)
+            )
+        self.render_data["skin_uri"] = self.skin_uri
+        return await render_template_card(self.star, template_name, self.render_data)
+
+async def render_dynamic_batch(renderers: list, template_name: str) -> list[str | None]:
+    """
+    Renderer / RunRenderer 的批量版本：同时补齐缺少的皮肤，再在一个页面中渲染所有卡片。
+    """
+    if not renderers:
+        return []
+    star = renderers[0].star
+    missing = [renderer for renderer in renderers if renderer.skin_uri is None]
+    skin_uris = await asyncio.gather(*(
+        fetch_skin_data_uri(renderer._uname, getattr(star, "http_client", None))
+        for renderer in missing
+    ))
+    for renderer, skin_uri in zip(missing, skin_uris):
+        renderer.skin_uri = skin_uri
+    for renderer in renderers:
+        renderer.render_data["skin_uri"] = renderer.skin_uri
+    return await render_template_cards(
+        star, template_name, [renderer.render_data for renderer in renderers]
+    )
@@ -0,0 +1,91 @@
+from datetime import datetime
+from astrbot.api.all import Star
+from .paceman import common_template_data, render_template_card
+from .utils import get_time
+
+# 图表区域大小（与 rank.html 中的 SVG viewBox 一致）
+ELO_CHART_SIZE = (1100, 250)
+TIME_CHART_SIZE = (1100, 150)
+CHART_PADDING = 12
+
+
+def _scale(value: float, low: float, high: float, size: float) -> float:
+    # SVG 的 y 轴向下，值越大越靠上
+    if high == low:
+        return size / 2
+    return CHART_PADDING + (size - 2 * CHART_PADDING) * (1 - (value - low) / (high - low))
+
+
+def _x(index: int, count: int, width: float) -> float:
+    if count <= 1:
+        return width / 2
+    return CHART_PADDING + (width - 2 * CHART_PADDING) * index / (count - 1)
+
+
+def format_match_time(milliseconds: int | None) -> str:
+    if milliseconds is None:
+        return "-"
+    minutes, seconds = get_time(milliseconds)
+    return f"{minutes}:{seconds:02d}"
+
+
+def rank_chart_data(matches: list[dict]) -> dict:
+    """
+    把按时间从旧到新的比赛记录转换成 SVG 折线和散点坐标。
+    """
+    width, height = ELO_CHART_SIZE
+    elos = [
+        (index, match["elo_rate"] + (match["elo_change"] or 0))
+        for index, match in enumerate(matches)
+        if match["elo_rate"] is not None
+    ]
+    elo_values = [elo for _, elo in elos]
+    elo_low, elo_high = (min(elo_values), max(elo_values)) if elo_values else (0, 0)
+    elo_points = " ".join(
+        f"{_x(index, len(matches), width):.1f},{_scale(elo, elo_low, elo_high, height):.1f}"
+        for index, elo in elos
+    )
+
+    time_width, time_height = TIME_CHART_SIZE
+    times = [(index, match["time"]) for index, match in enumerate(matches) if match["time"]]
+    time_values = [time for _, time in times]
+    time_low, time_high = (min(time_values), max(time_values)) if time_values else (0, 0)
+    time_points = [
+        {
+            "x": f"{_x(index, len(matches), time_width):.1f}",
+            "y": f"{_scale(time, time_low, time_high, time_height):.1f}",
+        }
+        for index, time in times
+    ]
+
+    wins = sum(1 for match in matches if match["won"] == 1)
+    losses = sum(1 for match in matches if match["won"] == 0)
+    return {
+        "match_count": len(matches),
+        "wins": wins,
+        "losses": losses,
+        "elo_points": elo_points,
+        "elo_low": elo_low,
+        "elo_high": elo_high,
+        "elo_delta": elo_values[-1] - elo_values[0] if len(elo_values) > 1 else 0,
+        "time_points": time_points,
+        "time_best": format_match_time(time_low if time_values else None),
+        "time_worst": format_match_time(time_high if time_values else None),
+        "first_date": datetime.fromtimestamp(matches[0]["date"]).strftime("%Y-%m-%d") if matches else "",
+        "last_date": datetime.fromtimestamp(matches[-1]["date"]).strftime("%Y-%m-%d") if matches else "",
+    }
+
+
+def rank_render_data(nickname: str, summary: list[dict], matches: list[dict]) -> dict:
+    """
+    summary 是卡片顶部按顺序展示的指标列表，每项为 {"label", "value"}（已格式化，见 ranked.ranked_summary）。
+    """
+    return common_template_data(nickname, include_assets=False) | {
+        "summary": summary,
+        "chart": rank_chart_data(matches),
+        "update_time": datetime.now().strftime("%Y-%m-%d %H:%M"),
+    }
+
+
+async def render_rank(star: Star, render_data: dict) -> str | None:
+    return await render_template_card(star, "rank", render_data)
@@ -1,5 +1,112 @@
+from functools import cached_property
 from pydantic import BaseModel, Field, ValidationError
+from .utils import get_time
 
 class UserInfo(BaseModel):
     name: str
-    uuid: str
\ No newline at end of file
+    uuid: str
+
+class RankedValue(BaseModel):
+    # Ranked API 的统计字段按比赛类型区分，只取排位赛
+    ranked: int | None = None
+
+class SeasonStats(BaseModel):
+    bestTime: RankedValue = Field(default_factory=RankedValue)
+    forfeits: RankedValue = Field(default_factory=RankedValue)
+    playedMatches: RankedValue = Field(default_factory=RankedValue)
+    completions: RankedValue = Field(default_factory=RankedValue)
+    completionTime: RankedValue = Field(default_factory=RankedValue)
+    wins: RankedValue = Field(default_factory=RankedValue)
+
+class UserStatistics(BaseModel):
+    season: SeasonStats = Field(default_factory=SeasonStats)
+
+class RankedUser(BaseModel):
+    """
+    /users/{username} 的响应，只解析需要的字段，其余字段忽略。
+    比率类指标在分母为 0 时为 None。
+    """
+    uuid: str
+    nickname: str
+    eloRate: int | None = None
+    eloRank: int | None = None
+    statistics: UserStatistics = Field(default_factory=UserStatistics)
+
+    @property
+    def season(self) -> SeasonStats:
+        return self.statistics.season
+
+    @cached_property
+    def best_time(self) -> int | None:
+        return self.season.bestTime.ranked
+
+    @cached_property
+    def played_matches(self) -> int:
+        return self.season.playedMatches.ranked or 0
+
+    @cached_property
+    def win_rate(self) -> float | None:
+        if not self.played_matches:
+            return None
+        return (self.season.wins.ranked or 0) / self.played_matches
+
+    @cached_property
+    def forfeit_rate(self) -> float | None:
+        if not self.played_matches:
+            return None
+        return (self.season.forfeits.ranked or 0) / self.played_matches
+
+    @cached_property
+    def average_completion(self) -> float | None:
+        completions = self.season.completions.ranked or 0
+        if not completions:
+            return None
+        return (self.season.completionTime.ranked or 0) / completions
+
+def parse_ranked_user(data: dict) -> RankedUser | None:
+    """
+    解析 user_stats 响应，查询失败或数据不完整时返回 None。
+    """
+    if not data or data.get("status") != "success":
+        return None
+    try:
+        return RankedUser.model_validate(data["data"])
+    except (KeyError, ValidationError):
+        return None
+
+def format_duration(milliseconds: float | None) -> str:
+    if milliseconds is None:
+        return "-"
+    minutes, seconds = get_time(milliseconds)
+    return f"{minutes}:{seconds:02d}"
+
+def format_duration_text(milliseconds: float | None) -> str:
+    if milliseconds is None:
+        return "-"
+    minutes, seconds = get_time(milliseconds)
+    return f"{minutes}分{seconds}秒"
+
+def format_rate(rate: float | None, digits: int = 2) -> str:
+    return "-" if rate is None else f"{rate * 100:.{digits}f}%"
+
+def ranked_text(user: RankedUser) -> str:
+    return (f"{user.nickname}:\n"
+            f"当前elo:{user.eloRate if user.eloRate is not None else '-'}\n"
+            f"当前elo排名:{user.eloRank if user.eloRank is not None else '-'}\n"
+            f"赛季PB:{format_duration_text(user.best_time)}\n"
+            f"赛季胜率:{format_rate(user.win_rate)}\n"
+            f"赛季弃权率:{format_rate(user.forfeit_rate)}\n"
+            f"赛季平均完成时间:{format_duration_text(user.average_completion)}")
+
+def ranked_summary(user: RankedUser) -> list[dict]:
+    """
+    卡片顶部展示的指标。
+    """
+    return [
+        {"label": "Elo", "value": user.eloRate if user.eloRate is not None else "-"},
+        {"label": "排名", "value": user.eloRank if user.eloRank is not None else "-"},
+        {"label": "赛季PB", "value": format_duration(user.best_time)},
+        {"label": "胜率", "value": format_rate(user.win_rate, 1)},
+        {"label": "弃权率", "value": format_rate(user.forfeit_rate, 1)},
+        {"label": "平均完成", "value": format_duration(user.average_completion)},
+    ]
@@ -0,0 +1,86 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable
+from astrbot.api import logger
+from .storage import ScheduleStore
+
+
+def next_run_time(hour: int, minute: int, now: datetime | None = None) -> datetime:
+    now = now or datetime.now()
+    run_at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if run_at <= now:
+        run_at += timedelta(days=1)
+    return run_at
+
+
+class BroadcastScheduler:
+    """
+    每个目标会话一个后台任务，每天在设定时间发送播报。
+    发送前 lead 秒开始准备数据（请求和渲染），到点后直接发送准备好的结果。
+    """
+
+    def __init__(
+        self,
+        store: ScheduleStore,
+        prepare: Callable[[dict, float], Awaitable[Any]],
+        send: Callable[[dict, Any], Awaitable[None]],
+        lead: float,
+    ):
+        self.store = store
+        self.prepare = prepare
+        self.send = send
+        self.lead = lead
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def start_all(self):
+        for schedule in self.store.all():
+            self._start(schedule)
+
+    def set(self, target: str, group_id: str | None, hour: int, minute: int):
+        self.store.upsert(target, group_id, hour, minute)
+        self._start(self.store.get(target))
+
+    def remove(self, target: str) -> bool:
+        task = self._tasks.pop(target, None)
+        if task:
+            task.cancel()
+        return self.store.remove(target)
+
+    def get(self, target: str) -> dict | None:
+        return self.store.get(target)
+
+    def _start(self, schedule: dict):
+        target = schedule["target"]
+        old_task = self._tasks.pop(target, None)
+        if old_task:
+            old_task.cancel()
+        self._tasks[target] = asyncio.create_task(self._run(schedule))
+
+    async def _run(self, schedule: dict):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                run_at = next_run_time(schedule["hour"], schedule["minute"])
+                # 用单调时钟计算，避免系统时间调整导致提前或重复发送
+                send_at = loop.time() + (run_at - datetime.now()).total_seconds()
+                prepare_at = send_at - self.lead
+                if prepare_at > loop.time():
+                    await asyncio.sleep(prepare_at - loop.time())
+                # 准备窗口留出 10% 的余量，保证到点时数据已经就绪
+                window = max(0.0, (send_at - loop.time()) * 0.9)
+                prepared = await self.prepare(schedule, window)
+                if send_at > loop.time():
+                    await asyncio.sleep(send_at - loop.time())
+                await self.send(schedule, prepared)
+                # 等过了本分钟再计算下一次，避免同一分钟内重复发送
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception(f"定时播报失败: {schedule['target']}")
+                await asyncio.sleep(60)
+
+    def close(self):
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
@@ -0,0 +1,162 @@
+import math
+from typing import NamedTuple
+from astrbot.api.all import Star
+from .constant import *
+from .paceman import common_template_data, render_template_card
+from .utils import get_time
+
+# numpy 可选，没有安装时用纯 Python 计算，结果一致
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+# 转化率：(起点阶段, 终点阶段)
+SPLIT_CONVERSIONS = (("nether", "stronghold"), ("stronghold", "finish"), ("nether", "finish"))
+
+
+class SplitSummary(NamedTuple):
+    # 时间均为毫秒；recent 是最近一个窗口的平均，previous 是再往前一个窗口的平均
+    count: int
+    median: float
+    p10: float
+    p90: float
+    recent: float
+    previous: float | None
+
+
+def _summarize_numpy(values: list, window: int) -> SplitSummary | None:
+    # None 和 0 都表示没有到达该阶段
+    times = np.asarray(values, dtype=float)
+    times = times[times > 0]
+    if times.size == 0:
+        return None
+    p10, median, p90 = np.percentile(times, (10, 50, 90))
+    # 前缀和一次算出所有窗口的滚动平均，只取最后两个窗口
+    sums = np.concatenate(([0.0], np.cumsum(times)))
+    size = min(window, times.size)
+    recent = (sums[-1] - sums[-1 - size]) / size
+    previous = None
+    if times.size >= 2 * window:
+        previous = (sums[-1 - window] - sums[-1 - 2 * window]) / window
+    return SplitSummary(int(times.size), float(median), float(p10), float(p90), float(recent), previous)
+
+
+def _percentile(ordered: list, q: float) -> float:
+    # 与 numpy 默认的线性插值一致
+    position = (len(ordered) - 1) * q / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _summarize_python(values: list, window: int) -> SplitSummary | None:
+    times = [float(value) for value in values if value and value > 0]
+    if not times:
+        return None
+    ordered = sorted(times)
+    size = min(window, len(times))
+    recent = sum(times[-size:]) / size
+    previous = None
+    if len(times) >= 2 * window:
+        previous = sum(times[-2 * window:-window]) / window
+    return SplitSummary(
+        len(times),
+        _percentile(ordered, 50),
+        _percentile(ordered, 10),
+        _percentile(ordered, 90),
+        recent,
+        previous,
+    )
+
+
+def split_summaries(
+    columns: dict[str, list],
+    window: int = SPLITS_ROLLING_WINDOW,
+) -> dict[str, SplitSummary | None]:
+    """
+    按列计算每个阶段的分布，columns 为 阶段 -> 从旧到新的时间列表（毫秒）。
+    """
+    summarize = _summarize_numpy if NUMPY_AVAILABLE else _summarize_python
+    return {split: summarize(columns.get(split, []), window) for split in SPLIT_ICONS}
+
+
+def conversion_rates(summaries: dict[str, SplitSummary | None]) -> list[tuple[str, str, float | None]]:
+    rates = []
+    for start, end in SPLIT_CONVERSIONS:
+        started = summaries[start].count if summaries[start] else 0
+        reached = summaries[end].count if summaries[end] else 0
+        rates.append((start, end, reached / started if started else None))
+    return rates
+
+
+def format_split_time(milliseconds: float | None) -> str:
+    if milliseconds is None:
+        return "-"
+    minutes, seconds = get_time(round(milliseconds))
+    return f"{minutes}:{seconds:02d}"
+
+
+def format_trend(summary: SplitSummary) -> str:
+    # 与上一个窗口相比快了为负，慢了为正
+    if summary.previous is None:
+        return ""
+    delta = round((summary.recent - summary.previous) / 1000)
+    sign = "-" if delta < 0 else "+"
+    minutes, seconds = divmod(abs(delta), 60)
+    return f"{sign}{minutes}:{seconds:02d}"
+
+
+def format_rate(rate: float | None) -> str:
+    return "-" if rate is None else f"{rate:.0%}"
+
+
+def splits_render_data(
+    uname: str,
+    columns: dict[str, list],
+    window: int = SPLITS_ROLLING_WINDOW,
+) -> dict:
+    summaries = split_summaries(columns, window)
+    rows = {}
+    for split in SPLIT_ICONS:
+        summary = summaries[split]
+        rows[split] = {
+            "label": SPLIT_LABELS[split],
+            "count": summary.count if summary else 0,
+            "median": format_split_time(summary.median if summary else None),
+            "p10": format_split_time(summary.p10 if summary else None),
+            "p90": format_split_time(summary.p90 if summary else None),
+            "recent": format_split_time(summary.recent if summary else None),
+            "trend": format_trend(summary) if summary else "",
+        }
+    return common_template_data(uname, include_assets=False) | {
+        "rows": rows,
+        "conversions": [
+            {"start": SPLIT_LABELS[start], "end": SPLIT_LABELS[end], "rate": format_rate(rate)}
+            for start, end, rate in conversion_rates(summaries)
+        ],
+        "total": len(columns.get("nether", [])),
+        "window": window,
+    }
+
+
+def splits_text(uname: str, render_data: dict) -> str:
+    lines = [f"{uname}的分段统计（共{render_data['total']}次run）"]
+    for row in render_data["rows"].values():
+        if not row["count"]:
+            continue
+        trend = f"({row['trend']})" if row["trend"] else ""
+        lines.append(
+            f"{row['label']}:{row['count']}次 中位{row['median']} "
+            f"P10 {row['p10']} P90 {row['p90']} 近{render_data['window']}次{row['recent']}{trend}"
+        )
+    lines.append(" ".join(
+        f"{item['start']}→{item['end']}:{item['rate']}" for item in render_data["conversions"]
+    ))
+    return "\n".join(lines)
+
+
+async def render_splits(star: Star, render_data: dict, skin_uri: str = "") -> str | None:
+    return await render_template_card(star, "splits", render_data | {"skin_uri": skin_uri})
@@ -0,0 +1,252 @@
+import json
+import os
+import sqlite3
+from astrbot.api import logger
+
+
+class SqliteStore:
+    """
+    基于 SQLite 的存储基类，子类在 _create_tables 中建表。
+    """
+
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_tables()
+
+    def _create_tables(self):
+        raise NotImplementedError
+
+    def close(self):
+        self.conn.close()
+
+
+class PlayerStore(SqliteStore):
+    """
+    QQ 号与游戏名的绑定记录，保存在 SQLite 中。
+    每次注册只更新一行并在事务中提交，进程崩溃也不会丢失其他玩家的绑定。
+    """
+
+    def __init__(self, db_path: str, legacy_json_path: str | None = None):
+        super().__init__(db_path)
+        if legacy_json_path:
+            self._migrate_json(legacy_json_path)
+
+    def _create_tables(self):
+        with self.conn:
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS players (
+                    userid TEXT PRIMARY KEY,
+                    username TEXT NOT NULL,
+                    nether_count INTEGER NOT NULL DEFAULT 0,
+                    gg_count INTEGER NOT NULL DEFAULT 0,
+                    gg_avg TEXT NOT NULL DEFAULT '0:00'
+                )
+                """
+            )
+            # 游戏名到 QQ 号的反向索引，不区分大小写
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_players_username "
+                "ON players (username COLLATE NOCASE)"
+            )
+            # 玩家在哪些群里注册过，用于按群生成排行榜
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS player_groups (
+                    userid TEXT NOT NULL,
+                    group_id TEXT NOT NULL,
+                    PRIMARY KEY (userid, group_id)
+                )
+                """
+            )
+
+    def _migrate_json(self, json_path: str):
+        # 旧版本把所有绑定整体写在一个 JSON 文件里，首次启动时导入并改名备份
+        if not os.path.exists(json_path):
+            return
+        try:
+            with open(json_path, "r", encoding="utf-8") as f:
+                legacy = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"读取旧玩家数据失败，跳过迁移: {e}")
+            return
+        rows = [
+            (
+                str(userid),
+                record["username"],
+                record.get("nether_count", 0),
+                record.get("gg_count", 0),
+                record.get("gg_avg", "0:00"),
+            )
+            for userid, record in legacy.items()
+            if isinstance(record, dict) and record.get("username")
+        ]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO players "
+                "(userid, username, nether_count, gg_count, gg_avg) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+        os.replace(json_path, f"{json_path}.migrated")
+        logger.info(f"已将 {len(rows)} 条玩家绑定从 {json_path} 迁移到 {self.db_path}")
+
+    def get(self, userid: str) -> dict | None:
+        row = self.conn.execute(
+            "SELECT * FROM players WHERE userid = ?", (str(userid),)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def get_username(self, userid: str) -> str | None:
+        row = self.conn.execute(
+            "SELECT username FROM players WHERE userid = ?", (str(userid),)
+        ).fetchone()
+        return row["username"] if row else None
+
+    def upsert(self, userid: str, username: str):
+        """
+        绑定或更新游戏名，保留已有的统计字段。
+        """
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO players (userid, username) VALUES (?, ?) "
+                "ON CONFLICT(userid) DO UPDATE SET username = excluded.username",
+                (str(userid), username),
+            )
+
+    def userids_for(self, username: str) -> list[str]:
+        rows = self.conn.execute(
+            "SELECT userid FROM players WHERE username = ? COLLATE NOCASE", (username,)
+        ).fetchall()
+        return [row["userid"] for row in rows]
+
+    def add_group(self, userid: str, group_id: str):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO player_groups (userid, group_id) VALUES (?, ?)",
+                (str(userid), str(group_id)),
+            )
+
+    def usernames(self, group_id: str | None = None) -> list[str]:
+        """
+        返回去重后的游戏名；指定群号时返回在该群注册过的玩家，
+        以及没有任何群记录的玩家（旧版本注册的玩家在重新注册前没有群记录）。
+        """
+        if group_id is None:
+            rows = self.conn.execute(
+                "SELECT MIN(username) AS username FROM players "
+                "GROUP BY username COLLATE NOCASE ORDER BY username COLLATE NOCASE"
+            ).fetchall()
+        else:
+            rows = self.conn.execute(
+                "SELECT MIN(p.username) AS username FROM players p "
+                "WHERE EXISTS (SELECT 1 FROM player_groups g WHERE g.userid = p.userid AND g.group_id = ?) "
+                "OR NOT EXISTS (SELECT 1 FROM player_groups g WHERE g.userid = p.userid) "
+                "GROUP BY p.username COLLATE NOCASE ORDER BY p.username COLLATE NOCASE",
+                (str(group_id),),
+            ).fetchall()
+        return [row["username"] for row in rows]
+
+    def __contains__(self, userid: str) -> bool:
+        return self.get_username(userid) is not None
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM players").fetchone()[0]
+
+
+class ScheduleStore(SqliteStore):
+    """
+    定时播报的目标会话和时间，插件重启后据此恢复定时任务。
+    """
+
+    def _create_tables(self):
+        with self.conn:
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS schedules (
+                    target TEXT PRIMARY KEY,
+                    group_id TEXT,
+                    hour INTEGER NOT NULL,
+                    minute INTEGER NOT NULL
+                )
+                """
+            )
+
+    def all(self) -> list[dict]:
+        rows = self.conn.execute("SELECT * FROM schedules").fetchall()
+        return [dict(row) for row in rows]
+
+    def get(self, target: str) -> dict | None:
+        row = self.conn.execute(
+            "SELECT * FROM schedules WHERE target = ?", (target,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def upsert(self, target: str, group_id: str | None, hour: int, minute: int):
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO schedules (target, group_id, hour, minute) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(target) DO UPDATE SET group_id = excluded.group_id, "
+                "hour = excluded.hour, minute = excluded.minute",
+                (target, group_id, hour, minute),
+            )
+
+    def remove(self, target: str) -> bool:
+        with self.conn:
+            cursor = self.conn.execute("DELETE FROM schedules WHERE target = ?", (target,))
+        return cursor.rowcount > 0
+
+
+class WatchStore(SqliteStore):
+    """
+    /watch 订阅：哪些会话关注了哪些玩家。
+    """
+
+    def _create_tables(self):
+        with self.conn:
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS watches (
+                    username TEXT NOT NULL COLLATE NOCASE,
+                    target TEXT NOT NULL,
+                    PRIMARY KEY (username, target)
+                )
+                """
+            )
+
+    def add(self, username: str, target: str) -> bool:
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO watches (username, target) VALUES (?, ?)",
+                (username, target),
+            )
+        return cursor.rowcount > 0
+
+    def remove(self, username: str, target: str) -> bool:
+        with self.conn:
+            cursor = self.conn.execute(
+                "DELETE FROM watches WHERE username = ? AND target = ?", (username, target)
+            )
+        return cursor.rowcount > 0
+
+    def targets_for(self, username: str) -> list[str]:
+        rows = self.conn.execute(
+            "SELECT target FROM watches WHERE username = ?", (username,)
+        ).fetchall()
+        return [row["target"] for row in rows]
+
+    def usernames_for(self, target: str) -> list[str]:
+        rows = self.conn.execute(
+            "SELECT username FROM watches WHERE target = ? ORDER BY username", (target,)
+        ).fetchall()
+        return [row["username"] for row in rows]
+
+    def usernames(self) -> list[str]:
+        rows = self.conn.execute(
+            "SELECT MIN(username) AS username FROM watches GROUP BY username"
+        ).fetchall()
+        return [row["username"] for row in rows]
@@ -1,24 +1,105 @@
+import asyncio
 import json
-import os
+import string
+from contextlib import aclosing
+from urllib.parse import urlencode
 from datetime import timedelta, datetime
 import httpx
 from astrbot.api import logger
+from .cache import ResponseCache
+from .limiter import upstream
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# 可选的更快 JSON 解析库
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+# 可选的增量 JSON 解析库，用于边下载边解析大响应
+try:
+    import ijson
+    IJSON_AVAILABLE = True
+except ImportError:
+    IJSON_AVAILABLE = False
 
 PACEMAN_BASE_URL="https://paceman.gg/stats/api"
 RANKED_BASE_URL="https://api.mcsrranked.com"
 
+# 连接池配置
+HTTP_MAX_CONNECTIONS = 30
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 10
+HTTP_KEEPALIVE_EXPIRY = 60.0
+HTTP_DEFAULT_TIMEOUT = 10.0
+
 API_ENDPOINTS = {
     "paceman": {
         "session_stats": "/getSessionStats/?name={username}&hours=24&hoursBetween=24",
         "nph_stats": "/getNPH/?name={username}&hours=24&hoursBetween=24",
-        "recent_runs": "/getRecentRuns/?name={username}&hours=99999&limit=500"
+        "recent_runs": "/getRecentRuns/?name={username}&hours=99999&limit={limit}"
     },
     "ranked": {
-        "user_stats": "/users/{username}"
+        "user_stats": "/users/{username}",
+        # 比赛记录，按 id 从新到旧；before/after 为 match id 游标，通过 params 追加
+        "matches": "/users/{username}/matches?type=2&count={count}",
     }
 }
 
-async def fetch_api_data(api_type: str, endpoint_type: str, username: str, timeout: float = 10.0):
+# 各端点响应缓存时间（秒），未列出的端点使用 API_CACHE_DEFAULT_TTL
+API_CACHE_TTL = {
+    "paceman": {
+        "session_stats": 60,
+        "nph_stats": 120,
+        "recent_runs": 60,
+    },
+    "ranked": {
+        "user_stats": 180,
+        "matches": 60,
+    },
+}
+API_CACHE_DEFAULT_TTL = 60
+API_CACHE_MAXSIZE = 512
+
+api_cache = ResponseCache(API_CACHE_MAXSIZE, API_CACHE_DEFAULT_TTL)
+
+# 同步历史 run 时逐步放大的分页大小，增量同步通常在第一页就能结束
+RECENT_RUN_PAGE_SIZES = (10, 50, 500)
+# 流式解析 run 列表时只保留的字段（与 paceman.RunStats 一致）
+RUN_RECORD_FIELDS = (
+    "id", "nether", "bastion", "fortress", "first_portal", "stronghold", "end", "finish",
+    "lootBastion", "obtainObsidian", "obtainCryingObsidian", "obtainRod",
+    "time", "updatedTime", "realUpdated",
+)
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    创建插件共享的 HTTP 客户端。
+    复用连接（keep-alive），安装了 h2 时启用 HTTP/2。
+    """
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    return httpx.AsyncClient(
+        timeout=HTTP_DEFAULT_TIMEOUT,
+        limits=limits,
+        http2=HTTP2_AVAILABLE,
+        follow_redirects=True,
+    )
+
+def build_api_url(
+    api_type: str,
+    endpoint_type: str,
+    username: str,
+    params: dict | None = None,
+) -> str:
     if api_type not in API_ENDPOINTS:
         raise ValueError(f"无效的API类型: {api_type}")
     
@@ -33,18 +114,58 @@ async def fetch_api_data(api_type: str, endpoint_type: str, username: str, timeo
     else:
         raise ValueError(f"不支持的API类型: {api_type}")
     
-    # 完整URL
+    # 完整URL；模板中没有用到的参数作为查询参数追加
     endpoint = API_ENDPOINTS[api_type][endpoint_type]
-    url = f"{base_url}{endpoint.format(username=username)}"
-    
+    params = params or {}
+    fields = {field for _, field, _, _ in string.Formatter().parse(endpoint) if field}
+    url = f"{base_url}{endpoint.format(username=username, **params)}"
+    extra = {key: value for key, value in params.items() if key not in fields and value is not None}
+    if extra:
+        url += ("&" if "?" in url else "?") + urlencode(extra)
+    return url
+
+async def fetch_api_data(
+    api_type: str,
+    endpoint_type: str,
+    username: str,
+    timeout: float = HTTP_DEFAULT_TIMEOUT,
+    client: httpx.AsyncClient | None = None,
+    use_cache: bool = True,
+    params: dict | None = None,
+):
+    url = build_api_url(api_type, endpoint_type, username, params)
+
+    if not use_cache:
+        return await _request_api_data(api_type, url, timeout, client)
+
+    # 同一玩家的相同请求在 TTL 内直接返回缓存，并发的相同请求共享一次上游调用。
+    # 返回值可能是缓存中的共享对象，调用方不要原地修改。
+    cache_key = (api_type, endpoint_type, username.lower(), tuple(sorted((params or {}).items())))
+    ttl = API_CACHE_TTL.get(api_type, {}).get(endpoint_type)
+    return await api_cache.get_or_fetch(
+        cache_key,
+        lambda: _request_api_data(api_type, url, timeout, client),
+        ttl=ttl,
+    )
+
+async def _request_api_data(
+    api_type: str,
+    url: str,
+    timeout: float,
+    client: httpx.AsyncClient | None,
+):
     logger.info(f"请求 {api_type} API: {url}")
-    
+
     try:
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            response = await client.get(url)
-            response.raise_for_status()
-            data = response.json()
-            return data
+        async with upstream(api_type):
+            if client is None:
+                async with httpx.AsyncClient(timeout=timeout) as temp_client:
+                    response = await temp_client.get(url)
+            else:
+                response = await client.get(url, timeout=timeout)
+        response.raise_for_status()
+        data = json_loads(response.content)
+        return data
     except httpx.HTTPStatusError as e:
         logger.error(f"{api_type} API HTTP错误: {e}")
         raise
@@ -58,19 +179,111 @@ async def fetch_api_data(api_type: str, endpoint_type: str, username: str, timeo
         logger.error(f"{api_type} API JSON解析错误: {e}")
         raise
 
+class _AsyncByteReader:
+    """
+    把 httpx 的字节流包装成 ijson 需要的异步文件对象。
+    """
+
+    def __init__(self, response: httpx.Response):
+        self._chunks = response.aiter_bytes()
+        self._buffer = b""
 
-# 加载json数据
-def load_data(filename):
-    # 传入filename文件名，返回json
-    if not os.path.exists(filename):
-        return {}
-    with open(filename, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    async def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buffer) < size:
+            try:
+                self._buffer += await self._chunks.__anext__()
+            except StopAsyncIteration:
+                break
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
 
-# 保存json数据
-def save_data(filename,dataname):
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(dataname, f, ensure_ascii=False, indent=4)
+async def stream_api_records(
+    api_type: str,
+    endpoint_type: str,
+    username: str,
+    fields: tuple,
+    timeout: float = HTTP_DEFAULT_TIMEOUT,
+    client: httpx.AsyncClient | None = None,
+    params: dict | None = None,
+):
+    """
+    流式请求返回 JSON 数组的端点，逐条产出只包含 fields 字段的记录。
+    安装了 ijson 时边下载边解析，调用方提前停止时剩余的响应不会再下载和解析。
+    不经过响应缓存，调用方应使用 contextlib.aclosing 及时释放连接。
+    """
+    url = build_api_url(api_type, endpoint_type, username, params)
+    logger.info(f"流式请求 {api_type} API: {url}")
+
+    async with upstream(api_type):
+        temp_client = None
+        if client is None:
+            temp_client = client = httpx.AsyncClient(timeout=timeout)
+        try:
+            async with client.stream("GET", url, timeout=timeout) as response:
+                response.raise_for_status()
+                if IJSON_AVAILABLE:
+                    items = ijson.items_async(_AsyncByteReader(response), "item", use_float=True)
+                    async for item in items:
+                        yield {field: item.get(field) for field in fields}
+                else:
+                    for item in json_loads(await response.aread()) or []:
+                        yield {field: item.get(field) for field in fields}
+        finally:
+            if temp_client is not None:
+                await temp_client.aclose()
+
+async def iter_recent_runs(
+    username: str,
+    client: httpx.AsyncClient | None = None,
+    page_sizes: tuple = RECENT_RUN_PAGE_SIZES,
+):
+    """
+    按从新到旧的顺序逐条产出玩家的 run。
+    先请求很小的一页，调用方没有提前停止时再用更大的 limit 请求，已产出的 run 不会重复。
+    """
+    seen = set()
+    for page, limit in enumerate(page_sizes):
+        count = 0
+        if page == 0:
+            # 第一页很小，走响应缓存
+            runs = await fetch_api_data(
+                "paceman", "recent_runs", username, client=client, params={"limit": limit}
+            )
+            records = _iter_list(runs or [])
+        else:
+            # 之后的大页流式解析，找到需要的 run 后不再读取剩余响应
+            records = stream_api_records(
+                "paceman", "recent_runs", username, RUN_RECORD_FIELDS,
+                client=client, params={"limit": limit},
+            )
+        async with aclosing(records):
+            async for run in records:
+                count += 1
+                if run["id"] in seen:
+                    continue
+                seen.add(run["id"])
+                yield run
+        if count < limit:
+            # 上游已经没有更多数据
+            return
+
+async def _iter_list(items: list):
+    for item in items:
+        yield item
+
+async def fetch_optional(awaitable, timeout: float, default, description: str):
+    """
+    在超时时间内等待一个非关键请求，失败时返回默认值而不是抛出异常。
+    """
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        logger.info(f"{description}超时，使用默认值")
+    except Exception as e:
+        logger.info(f"{description}失败，使用默认值: {e}")
+    return default
 
 def get_time(seconds):
     stdtime = timedelta(seconds=seconds/1000)
@@ -78,5 +291,17 @@ def get_time(seconds):
     seconds = stdtime.seconds % 60
     return minutes,seconds
 
+def parse_time(text: str) -> int:
+    """
+    把 "分:秒" 或 "时:分:秒" 格式的时间转换为秒数，无法解析时返回一个很大的值便于排序。
+    """
+    try:
+        seconds = 0
+        for part in str(text).split(":"):
+            seconds = seconds * 60 + int(part)
+        return seconds
+    except ValueError:
+        return 10 ** 9
+
 def to_local_time(timestamp):
     return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d")
\ No newline at end of file
@@ -0,0 +1,134 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+import httpx
+from astrbot.api import logger
+from .constant import *
+from .storage import WatchStore
+from .utils import fetch_api_data, get_time
+
+
+@dataclass
+class WatchState:
+    # 上一次看到的 run 及其已经到达的阶段
+    run_id: int | None = None
+    splits: set = field(default_factory=set)
+    interval: float = WATCH_ACTIVE_INTERVAL
+    next_poll_at: float = 0.0
+    initialized: bool = False
+
+
+class PaceWatcher:
+    """
+    所有 /watch 订阅共用一个后台轮询任务。
+    每个玩家只请求一次最近的 run，与订阅的会话数量无关；
+    正在游戏的玩家高频轮询，空闲的玩家逐步降低频率。
+    """
+
+    def __init__(
+        self,
+        store: WatchStore,
+        notify: Callable[[str, str], Awaitable[None]],
+        client: httpx.AsyncClient | None = None,
+    ):
+        self.store = store
+        self.notify = notify
+        self.client = client
+        self._states: dict[str, WatchState] = {}
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def add(self, username: str, target: str) -> bool:
+        added = self.store.add(username, target)
+        # 新订阅的玩家立即纳入下一轮轮询
+        self._states.setdefault(username.lower(), WatchState())
+        self.start()
+        return added
+
+    def remove(self, username: str, target: str) -> bool:
+        removed = self.store.remove(username, target)
+        if not self.store.targets_for(username):
+            self._states.pop(username.lower(), None)
+        return removed
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(WATCH_CONCURRENCY)
+
+        async def poll_guarded(username: str, state: WatchState):
+            async with semaphore:
+                await self._poll(username, state)
+
+        while True:
+            try:
+                now = loop.time()
+                due = []
+                for username in self.store.usernames():
+                    state = self._states.setdefault(username.lower(), WatchState())
+                    if state.next_poll_at <= now:
+                        due.append((username, state))
+                if due:
+                    await asyncio.gather(*(poll_guarded(u, s) for u, s in due))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Watch poller error:")
+            await asyncio.sleep(WATCH_TICK)
+
+    async def _poll(self, username: str, state: WatchState):
+        loop = asyncio.get_running_loop()
+        try:
+            runs = await fetch_api_data(
+                "paceman", "recent_runs", username,
+                client=self.client, use_cache=False, params={"limit": 1},
+            )
+        except Exception as e:
+            logger.info(f"轮询 {username} 失败: {e}")
+            state.interval = min(WATCH_IDLE_INTERVAL, state.interval * 2)
+            state.next_poll_at = loop.time() + state.interval
+            return
+
+        run = runs[0] if runs else None
+        messages = self._diff(username, state, run)
+        for message in messages:
+            for target in self.store.targets_for(username):
+                try:
+                    await self.notify(target, message)
+                except Exception as e:
+                    logger.info(f"推送 {username} 的 pace 失败: {e}")
+
+        # 正在游戏时保持高频，否则逐步退避
+        active = run is not None and time.time() - run.get("updatedTime", 0) < WATCH_ACTIVE_WINDOW
+        if active:
+            state.interval = WATCH_ACTIVE_INTERVAL
+        else:
+            state.interval = min(WATCH_IDLE_INTERVAL, state.interval * 2)
+        state.next_poll_at = loop.time() + state.interval
+
+    def _diff(self, username: str, state: WatchState, run: dict | None) -> list[str]:
+        if run is None:
+            state.initialized = True
+            return []
+        reached = {split for split in WATCH_SPLITS if run.get(split)}
+        if not state.initialized:
+            # 第一次看到时只记录状态，不推送历史 run
+            state.run_id, state.splits, state.initialized = run["id"], reached, True
+            return []
+        if run["id"] != state.run_id:
+            state.run_id, state.splits = run["id"], set()
+        new_splits = [split for split in WATCH_SPLITS if split in reached - state.splits]
+        state.splits |= reached
+        messages = []
+        for split in new_splits:
+            minutes, seconds = get_time(run[split])
+            messages.append(f"{username} {WATCH_SPLITS[split]} {minutes}:{seconds:02d}")
+        return messages
+
+    def close(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None